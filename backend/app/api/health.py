@@ -1,54 +1,91 @@
-"""
-Health check endpoints
-"""
-
-from fastapi import APIRouter, Depends  # type: ignore
-from loguru import logger
-
-from app.database import get_db_pool
-from app.services.telegram_bot import telegram_service
-
-router = APIRouter()
-
-
-@router.get("/")
-async def health_check():
-    """Basic health check"""
-    return {
-        "status": "healthy",
-        "service": "telegram-bot-backend"
-    }
-
-
-@router.get("/detailed")
-async def detailed_health_check(db = Depends(get_db_pool)):
-    """Detailed health check with service status"""
-    checks = {
-        "api": "healthy",
-        "database": "unknown",
-        "telegram_bot": "unknown"
-    }
-    
-    # Check database
-    try:
-        async with db.acquire() as conn:
-            await conn.fetchval("SELECT 1")
-        checks["database"] = "healthy"
-    except Exception as e:
-        logger.error(f"Database health check failed: {e}")
-        checks["database"] = "unhealthy"
-    
-    # Check Telegram bot
-    try:
-        bot_info = await telegram_service.get_bot_info()
-        checks["telegram_bot"] = "healthy" if bot_info else "unhealthy"
-    except Exception as e:
-        logger.error(f"Telegram bot health check failed: {e}")
-        checks["telegram_bot"] = "unhealthy"
-    
-    overall_status = "healthy" if all(v == "healthy" for v in checks.values()) else "degraded"
-    
-    return {
-        "status": overall_status,
-        "checks": checks
-    }
+"""
+Health check endpoints
+"""
+
+import asyncio
+import time
+from typing import Any, Dict
+
+from fastapi import APIRouter, Request  # type: ignore
+from loguru import logger
+
+from app.services.telegram_bot import telegram_service
+
+router = APIRouter()
+
+# Detailed health results are memoized briefly so probe storms don't hit
+# the database and Telegram API on every request
+_CACHE_TTL = 5.0
+_cache: Dict[str, Any] = {"ts": 0.0, "payload": None}
+_cache_lock = asyncio.Lock()
+
+
+def _is_cache_fresh() -> bool:
+    """Check whether the cached detailed health payload is still valid"""
+    return _cache["payload"] is not None and time.monotonic() - _cache["ts"] < _CACHE_TTL
+
+
+@router.get("/")
+async def health_check():
+    """Basic health check"""
+    return {
+        "status": "healthy",
+        "service": "telegram-bot-backend"
+    }
+
+
+@router.get("/detailed")
+async def detailed_health_check(request: Request):
+    """Detailed health check with service status"""
+    if _is_cache_fresh():
+        return _cache["payload"]
+    
+    # Single-flight: concurrent callers wait for one refresh
+    async with _cache_lock:
+        if _is_cache_fresh():
+            return _cache["payload"]
+        
+        payload = await _run_health_checks(request.app.state.db_pool)
+        _cache["payload"] = payload
+        _cache["ts"] = time.monotonic()
+        return payload
+
+
+async def _run_health_checks(db) -> Dict[str, Any]:
+    """Run the database and Telegram bot checks concurrently"""
+    
+    async def _check_db() -> str:
+        async with db.acquire() as conn:
+            await conn.fetchval("SELECT 1")
+        return "healthy"
+    
+    async def _check_bot() -> str:
+        # Call Telegram directly: get_bot_info() is memoized for the process and
+        # would keep reporting healthy after the token is revoked
+        await telegram_service.bot.get_me()
+        return "healthy"
+    
+    db_status, bot_status = await asyncio.gather(
+        _check_db(), _check_bot(), return_exceptions=True
+    )
+    
+    if isinstance(db_status, BaseException):
+        logger.error(f"Database health check failed: {db_status}")
+        db_status = "unhealthy"
+    
+    if isinstance(bot_status, BaseException):
+        logger.error(f"Telegram bot health check failed: {bot_status}")
+        bot_status = "unhealthy"
+    
+    checks = {
+        "api": "healthy",
+        "database": db_status,
+        "telegram_bot": bot_status
+    }
+    
+    overall_status = "healthy" if all(v == "healthy" for v in checks.values()) else "degraded"
+    
+    return {
+        "status": overall_status,
+        "checks": checks
+    }
@@ -2,32 +2,47 @@
 Telegram bot webhook and API endpoints
 """
 
-from fastapi import APIRouter, Request, HTTPException, Depends, Header
+import asyncio
+import hmac
+
+import orjson
+from fastapi import APIRouter, BackgroundTasks, Request, HTTPException, Depends, Header
 from telegram import Update
 from loguru import logger
 
 from app.config import settings
 from app.services.telegram_bot import telegram_service
 from app.services.auth_service import auth_service
-from app.database import get_db_pool
 
 router = APIRouter()
 
 
+def require_api_key(x_api_key: str = Header(...)):
+    """Verify the shared API key (basic security) in constant time"""
+    if not hmac.compare_digest(x_api_key.encode(), settings.API_SECRET_KEY.encode()):
+        raise HTTPException(status_code=401, detail="Invalid API key")
+
+
 @router.post("/webhook")
-async def telegram_webhook(request: Request):
+async def telegram_webhook(request: Request, background_tasks: BackgroundTasks):
     """
     Telegram webhook endpoint
     Receives updates from Telegram servers
     """
     try:
-        data = await request.json()
+        data = orjson.loads(await request.body())
         update = Update.de_json(data, telegram_service.bot)
         
-        # Process update in background
-        await telegram_service.process_update(update)
+        # Acknowledge now, process after the response is sent
+        if settings.WEBHOOK_WORKERS > 0:
+            telegram_service.enqueue_update(update)
+        else:
+            background_tasks.add_task(telegram_service.process_update, update)
         
         return {"status": "ok"}
+    except asyncio.QueueFull:
+        logger.warning("Telegram update queue is full, asking Telegram to retry")
+        raise HTTPException(status_code=429, detail="Too many pending updates")
     except Exception as e:
         logger.error(f"Error processing Telegram webhook: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -82,22 +97,17 @@ async def get_bot_info():
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/generate-auth-code")
+@router.post("/generate-auth-code", dependencies=[Depends(require_api_key)])
 async def generate_auth_code(
     user_id: str,
-    x_api_key: str = Header(...),
-    db = Depends(get_db_pool)
+    request: Request
 ):
     """
     Generate authentication code for user
     Called from Next.js app
     """
-    # Verify API key (basic security)
-    if x_api_key != settings.API_SECRET_KEY:
-        raise HTTPException(status_code=401, detail="Invalid API key")
-    
     try:
-        code = await auth_service.generate_auth_code(user_id, db)
+        code = await auth_service.generate_auth_code(user_id, request.app.state.db_pool)
         return {
             "code": code,
             "expires_in_minutes": settings.AUTH_CODE_EXPIRY_MINUTES
@@ -107,42 +117,34 @@ async def generate_auth_code(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/connection-status/{user_id}")
+@router.get("/connection-status/{user_id}", dependencies=[Depends(require_api_key)])
 async def get_connection_status(
     user_id: str,
-    x_api_key: str = Header(...),
-    db = Depends(get_db_pool)
+    request: Request
 ):
     """
     Get Telegram connection status for user
     Called from Next.js app
     """
-    if x_api_key != settings.API_SECRET_KEY:
-        raise HTTPException(status_code=401, detail="Invalid API key")
-    
     try:
-        status = await auth_service.get_connection_status(user_id, db)
+        status = await auth_service.get_connection_status(user_id, request.app.state.db_pool)
         return status
     except Exception as e:
         logger.error(f"Error getting connection status: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/disconnect/{user_id}")
+@router.post("/disconnect/{user_id}", dependencies=[Depends(require_api_key)])
 async def disconnect_telegram(
     user_id: str,
-    x_api_key: str = Header(...),
-    db = Depends(get_db_pool)
+    request: Request
 ):
     """
     Disconnect Telegram account for user
     Called from Next.js app
     """
-    if x_api_key != settings.API_SECRET_KEY:
-        raise HTTPException(status_code=401, detail="Invalid API key")
-    
     try:
-        success = await auth_service.disconnect_user(user_id, db)
+        success = await auth_service.disconnect_user(user_id, request.app.state.db_pool)
         return {"success": success}
     except Exception as e:
         logger.error(f"Error disconnecting Telegram: {e}")
@@ -0,0 +1,39 @@
+"""
+Shared Redis client
+Optional: every caller must handle get_redis() returning None
+"""
+
+from typing import Optional
+import redis.asyncio as redis  # type: ignore
+from loguru import logger  # type: ignore
+
+from app.config import settings
+
+
+# Global Redis client (None when REDIS_URL is not configured)
+_redis: Optional[redis.Redis] = None
+
+
+def get_redis() -> Optional[redis.Redis]:
+    """Get the shared Redis client, creating it on first use"""
+    global _redis
+    
+    if _redis is None and settings.REDIS_URL:
+        _redis = redis.Redis.from_url(
+            settings.REDIS_URL,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        )
+        logger.info("✓ Redis client created")
+    
+    return _redis
+
+
+async def close_redis():
+    """Close the shared Redis client"""
+    global _redis
+    
+    if _redis is not None:
+        await _redis.aclose()
+        logger.info("✓ Redis client closed")
+        _redis = None
@@ -18,12 +18,49 @@ class Settings(BaseSettings):
     SUPABASE_URL: str
     SUPABASE_ANON_KEY: str
     SUPABASE_SERVICE_ROLE_KEY: str
+    DB_POOL_MIN_SIZE: int = 5
+    DB_POOL_MAX_SIZE: int = 40
+    DB_POOL_MAX_INACTIVE_LIFETIME: float = 300.0
+    DB_POOL_PRE_PING: bool = False
+    DB_COMMAND_TIMEOUT: float = 30.0
+    # Prepared statements cached per connection (keep 0 behind the Supabase transaction pooler)
+    DB_STATEMENT_CACHE_SIZE: int = 0
+    # HNSW search breadth, set per vector search transaction (0 keeps the server default of 40)
+    HNSW_EF_SEARCH: int = 0
+    # pgvector >= 0.8: keep scanning the HNSW graph until enough rows pass the
+    # user_id filter ("" keeps the server default)
+    HNSW_ITERATIVE_SCAN: Literal["", "off", "strict_order", "relaxed_order"] = ""
+    
+    # Redis (optional; shares caches across workers and processes)
+    REDIS_URL: str = ""
+    REDIS_SOCKET_TIMEOUT: float = 0.5
+    TELEGRAM_STATUS_CACHE_TTL: int = 60
+    # Short, so a user who connects on another worker isn't locked out for long
+    TELEGRAM_STATUS_NEGATIVE_CACHE_TTL: int = 5
+    # In-process cache of connected users, only used without Redis; kept short
+    # because a /disconnect handled by another process can't evict it
+    TELEGRAM_STATUS_LOCAL_CACHE_TTL: int = 3
     
     # GitHub Models API
     GITHUB_TOKEN: str
     GITHUB_MODELS_ENDPOINT: str = "https://models.inference.ai.azure.com"
     EMBEDDING_MODEL: str = "text-embedding-3-small"
     
+    # Per-user flood control on incoming updates (0 disables)
+    TELEGRAM_RATE_LIMIT_PER_SECOND: int = 10
+    
+    # Webhook processing (0 workers runs each update as a response background task)
+    WEBHOOK_WORKERS: int = 4
+    WEBHOOK_QUEUE_SIZE: int = 1000
+    
+    # Attachments (Telegram's Bot API won't serve downloads above 20 MB)
+    MAX_FILE_SIZE_BYTES: int = 20 * 1024 * 1024
+    
+    # Server (0 workers uses half the CPU cores; each worker opens its own DB pool).
+    # Per-chat reply ordering only holds within one worker, and more than one
+    # worker requires REDIS_URL so rate limits and status caches are shared
+    SERVER_WORKERS: int = 1
+    
     # Application
     APP_BASE_URL: str = "http://localhost:3000"
     API_SECRET_KEY: str
@@ -2,16 +2,97 @@
 Database connection and utilities
 """
 
+import asyncio
+import struct
 import asyncpg  # type: ignore
 from contextlib import asynccontextmanager
-from typing import Optional
+from typing import AsyncIterator, Optional, Union
 from loguru import logger  # type: ignore
 
 from app.config import settings
 
 
+# Services accept either the pool or a connection already held by the caller
+PoolOrConnection = Union[asyncpg.Pool, asyncpg.Connection]
+
 # Global connection pool
 _pool: Optional[asyncpg.Pool] = None
+_pool_lock = asyncio.Lock()
+# Schema of the pgvector type, looked up once per process
+_vector_schema: Optional[str] = None
+
+# HNSW search settings, applied per transaction so they hold behind the
+# Supabase transaction pooler and never leak into another client's session
+_HNSW_SET_LOCAL_SQL = "; ".join(
+    f"SET LOCAL {name} = {value}"
+    for name, value in (
+        ("hnsw.ef_search", int(settings.HNSW_EF_SEARCH)),
+        ("hnsw.iterative_scan", settings.HNSW_ITERATIVE_SCAN),
+    )
+    if value
+)
+
+
+def _encode_vector(embedding) -> bytes:
+    """Encode a float sequence in pgvector's binary format (dim, unused, float4[])"""
+    dim = len(embedding)
+    return struct.pack(f">HH{dim}f", dim, 0, *embedding)
+
+
+def _decode_vector(data: bytes) -> list:
+    """Decode pgvector's binary format into a list of floats"""
+    dim, _ = struct.unpack_from(">HH", data)
+    return list(struct.unpack_from(f">{dim}f", data, 4))
+
+
+def _encode_halfvec(embedding) -> bytes:
+    """Encode a float sequence in pgvector's halfvec binary format (dim, unused, float2[])"""
+    dim = len(embedding)
+    return struct.pack(f">HH{dim}e", dim, 0, *embedding)
+
+
+def _decode_halfvec(data: bytes) -> list:
+    """Decode pgvector's halfvec binary format into a list of floats"""
+    dim, _ = struct.unpack_from(">HH", data)
+    return list(struct.unpack_from(f">{dim}e", data, 4))
+
+
+async def _register_vector_codec(conn: asyncpg.Connection):
+    """Send and receive vector/halfvec columns as binary float lists instead of text literals"""
+    global _vector_schema
+    
+    if _vector_schema is None:
+        _vector_schema = await conn.fetchval(
+            "SELECT typnamespace::regnamespace::text FROM pg_type WHERE typname = 'vector'"
+        )
+        if _vector_schema is None:
+            logger.warning("pgvector type not found; vector codec not registered")
+            return
+    
+    await conn.set_type_codec(
+        "vector",
+        schema=_vector_schema,
+        encoder=_encode_vector,
+        decoder=_decode_vector,
+        format="binary",
+    )
+    await conn.set_type_codec(
+        "halfvec",
+        schema=_vector_schema,
+        encoder=_encode_halfvec,
+        decoder=_decode_halfvec,
+        format="binary",
+    )
+
+
+async def _ping_connection(conn: asyncpg.Connection):
+    """Validate a pooled connection before handing it out"""
+    await conn.execute("SELECT 1")
+
+
+async def _init_connection(conn: asyncpg.Connection):
+    """Register codecs on each new pooled connection"""
+    await _register_vector_codec(conn)
 
 
 async def init_db_pool():
@@ -21,10 +102,16 @@ async def init_db_pool():
     try:
         _pool = await asyncpg.create_pool(
             settings.DATABASE_URL,
-            min_size=2,
-            max_size=10,
-            command_timeout=60,
-            statement_cache_size=0,  # Disable prepared statements for Supabase pooler
+            min_size=settings.DB_POOL_MIN_SIZE,
+            max_size=settings.DB_POOL_MAX_SIZE,
+            # Recycle idle connections before the Supabase pooler drops them
+            max_inactive_connection_lifetime=settings.DB_POOL_MAX_INACTIVE_LIFETIME,
+            command_timeout=settings.DB_COMMAND_TIMEOUT,
+            # Named prepared statements break behind the Supabase transaction pooler;
+            # enable on direct/session connections to skip parse+plan on hot queries
+            statement_cache_size=settings.DB_STATEMENT_CACHE_SIZE,
+            setup=_ping_connection if settings.DB_POOL_PRE_PING else None,
+            init=_init_connection,
         )
         logger.info("✓ Database connection pool created")
         return _pool
@@ -45,10 +132,14 @@ async def close_db_pool():
 
 async def get_db_pool() -> asyncpg.Pool:
     """Get database connection pool (dependency injection)"""
-    global _pool
+    if _pool is not None:
+        return _pool
     
-    if not _pool:
-        _pool = await init_db_pool()
+    # Pool is normally created at startup; the lock stops concurrent
+    # first callers from each creating (and leaking) a pool
+    async with _pool_lock:
+        if _pool is None:
+            await init_db_pool()
     
     return _pool
 
@@ -59,3 +150,31 @@ async def get_db_connection():
     pool = await get_db_pool()
     async with pool.acquire() as connection:
         yield connection
+
+
+@asynccontextmanager
+async def acquire(db: PoolOrConnection) -> AsyncIterator[asyncpg.Connection]:
+    """
+    Borrow a connection from the pool, or reuse the caller's connection
+    Lets one update run several queries on a single pinned connection
+    """
+    if isinstance(db, asyncpg.Pool):
+        async with db.acquire() as connection:
+            yield connection
+    else:
+        yield db
+
+
+@asynccontextmanager
+async def vector_search(conn: asyncpg.Connection) -> AsyncIterator[None]:
+    """
+    Run the enclosed vector queries with the configured HNSW settings
+    Opens a transaction only when there is something to SET LOCAL
+    """
+    if not _HNSW_SET_LOCAL_SQL:
+        yield
+        return
+    
+    async with conn.transaction():
+        await conn.execute(_HNSW_SET_LOCAL_SQL)
+        yield
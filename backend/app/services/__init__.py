@@ -6,10 +6,12 @@ from .telegram_bot import TelegramBotService
 from .auth_service import AuthService
 from .embedding_service import EmbeddingService
 from .memory_service import MemoryService
+from .outbound_batcher import OutboundBatcher
 
 __all__ = [
     "TelegramBotService",
     "AuthService",
     "EmbeddingService",
     "MemoryService",
+    "OutboundBatcher",
 ]
@@ -3,48 +3,123 @@ Authentication Service
 Handles auth code generation and verification for Telegram bot
 """
 
+import base64
+import math
 import secrets
-import string
 from datetime import datetime, timedelta, timezone
 from typing import Optional, Dict, Any
 from loguru import logger  # type: ignore
-import asyncpg  # type: ignore
+from cachetools import TTLCache  # type: ignore
+import orjson  # type: ignore
 
 from app.config import settings
+from app.cache import get_redis
+from app.database import PoolOrConnection, acquire
+
+
+# Connection lookups run on every Telegram update, so connected users are cached briefly
+_STATUS_CACHE_SIZE = 10_000
+# Written in place of a status on connect/disconnect. A lookup that read
+# Postgres before the change can finish afterwards; fills use SET NX, so it
+# can't put the stale status back while the tombstone is there. It lives as
+# long as a query may run, which bounds how late such a fill can arrive
+_STATUS_TOMBSTONE = b"-"
+_STATUS_TOMBSTONE_TTL = math.ceil(settings.DB_COMMAND_TIMEOUT)
+
+
+def _status_key(telegram_user_id: str) -> str:
+    """Redis key for a cached connection status"""
+    return f"tg:status:{telegram_user_id}"
 
 
 class AuthService:
     """Service for managing Telegram bot authentication"""
     
-    async def generate_auth_code(self, user_id: str, db: asyncpg.Pool) -> str:
+    def __init__(self):
+        # telegram_user_id -> status dict; only connected users are cached so a
+        # fresh /connect on another worker is never hidden by a stale miss.
+        # Used only without Redis, since invalidation can't reach other processes
+        self._status_cache: TTLCache = TTLCache(
+            maxsize=_STATUS_CACHE_SIZE, ttl=settings.TELEGRAM_STATUS_LOCAL_CACHE_TTL
+        )
+        # Bumped on every invalidation; a lookup that overlapped one doesn't
+        # fill the local cache with what it read before the change
+        self._status_generation = 0
+    
+    async def _get_shared_status(self, telegram_user_id: str) -> Optional[Dict[str, Any]]:
+        """Read a cached status from Redis, if configured"""
+        redis = get_redis()
+        if redis is None:
+            return None
+        
+        try:
+            cached = await redis.get(_status_key(telegram_user_id))
+        except Exception as e:
+            logger.warning(f"Redis status lookup failed: {e}")
+            return None
+        
+        if not cached or cached == _STATUS_TOMBSTONE:
+            return None
+        return orjson.loads(cached)
+    
+    async def _set_shared_status(self, telegram_user_id: str, status: Dict[str, Any]):
+        """Write a status to Redis unless the key is taken; disconnected users expire quickly"""
+        redis = get_redis()
+        if redis is None:
+            return
+        
+        ttl = (
+            settings.TELEGRAM_STATUS_CACHE_TTL if status["connected"]
+            else settings.TELEGRAM_STATUS_NEGATIVE_CACHE_TTL
+        )
+        try:
+            await redis.set(_status_key(telegram_user_id), orjson.dumps(status), ex=ttl, nx=True)
+        except Exception as e:
+            logger.warning(f"Redis status write failed: {e}")
+    
+    async def _invalidate_status(self, *telegram_user_ids: str):
+        """Replace cached statuses with tombstones after a connect/disconnect"""
+        self._status_generation += 1
+        for telegram_user_id in telegram_user_ids:
+            self._status_cache.pop(telegram_user_id, None)
+        
+        redis = get_redis()
+        if redis is None or not telegram_user_ids:
+            return
+        
+        try:
+            async with redis.pipeline(transaction=False) as pipe:
+                for telegram_user_id in telegram_user_ids:
+                    pipe.set(
+                        _status_key(telegram_user_id), _STATUS_TOMBSTONE, ex=_STATUS_TOMBSTONE_TTL
+                    )
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Redis status invalidation failed: {e}")
+    
+    async def generate_auth_code(self, user_id: str, db: PoolOrConnection) -> str:
         """
         Generate a random authentication code for user
         Returns the code that should be shown to user
         """
-        # Generate random code
-        code = ''.join(
-            secrets.choice(string.ascii_uppercase + string.digits)
-            for _ in range(settings.AUTH_CODE_LENGTH)
-        )
+        # Generate random code from a single RNG read; base32 maps every
+        # 5 bits to A-Z/2-7 without modulo bias
+        num_bytes = -(-settings.AUTH_CODE_LENGTH * 5 // 8)
+        code = base64.b32encode(secrets.token_bytes(num_bytes)).decode()[:settings.AUTH_CODE_LENGTH]
         
         expires_at = datetime.now(timezone.utc) + timedelta(
             minutes=settings.AUTH_CODE_EXPIRY_MINUTES
         )
         
-        async with db.acquire() as conn:
-            # Invalidate any existing codes for this user
-            await conn.execute(
-                """
-                UPDATE telegram_auth_codes
-                SET is_used = true
-                WHERE user_id = $1 AND is_used = false
-                """,
-                user_id
-            )
-            
-            # Insert new code
+        async with acquire(db) as conn:
+            # Invalidate any existing codes and insert the new one in one round trip
             await conn.execute(
                 """
+                WITH invalidated AS (
+                    UPDATE telegram_auth_codes
+                    SET is_used = true
+                    WHERE user_id = $1 AND is_used = false
+                )
                 INSERT INTO telegram_auth_codes (user_id, code, expires_at)
                 VALUES ($1, $2, $3)
                 """,
@@ -61,109 +136,107 @@ class AuthService:
         telegram_username: Optional[str],
         telegram_first_name: Optional[str],
         telegram_last_name: Optional[str],
-        db: asyncpg.Pool
+        db: PoolOrConnection
     ) -> Dict[str, Any]:
         """
         Verify auth code and connect Telegram account to MemoryVault account
         Returns success status and error message if failed
         """
-        async with db.acquire() as conn:
-            # Find valid auth code
+        # Validate the code, upsert the connection and consume the code in one
+        # statement; the code row is locked so it can't be redeemed twice
+        async with acquire(db) as conn:
             row = await conn.fetchrow(
                 """
-                SELECT user_id, expires_at, is_used
-                FROM telegram_auth_codes
-                WHERE code = $1
-                ORDER BY created_at DESC
-                LIMIT 1
+                WITH code AS (
+                    SELECT user_id, expires_at, is_used
+                    FROM telegram_auth_codes
+                    WHERE code = $1
+                    ORDER BY created_at DESC
+                    LIMIT 1
+                    FOR UPDATE
+                ),
+                existing AS (
+                    SELECT user_id
+                    FROM telegram_connections
+                    WHERE telegram_user_id = $2 AND is_active = true
+                ),
+                valid AS (
+                    SELECT user_id
+                    FROM code
+                    WHERE NOT is_used
+                    AND expires_at >= NOW()
+                    AND NOT EXISTS (
+                        SELECT 1 FROM existing WHERE existing.user_id <> code.user_id
+                    )
+                ),
+                connection AS (
+                    INSERT INTO telegram_connections (
+                        user_id, telegram_user_id, telegram_username,
+                        telegram_first_name, telegram_last_name, is_active
+                    )
+                    SELECT user_id, $2, $3, $4, $5, true
+                    FROM valid
+                    ON CONFLICT (telegram_user_id)
+                    DO UPDATE SET
+                        user_id = EXCLUDED.user_id,
+                        telegram_username = $3,
+                        telegram_first_name = $4,
+                        telegram_last_name = $5,
+                        is_active = true,
+                        connected_at = NOW()
+                    RETURNING user_id
+                ),
+                used AS (
+                    UPDATE telegram_auth_codes
+                    SET is_used = true
+                    WHERE code = $1 AND EXISTS (SELECT 1 FROM connection)
+                )
+                SELECT
+                    code.user_id,
+                    code.is_used AS used,
+                    code.expires_at < NOW() AS expired,
+                    (SELECT user_id FROM existing) AS connected_user_id,
+                    EXISTS (SELECT 1 FROM connection) AS connected
+                FROM code
                 """,
-                auth_code
+                auth_code, telegram_user_id, telegram_username,
+                telegram_first_name, telegram_last_name
             )
-            
-            if not row:
-                return {"success": False, "error": "Invalid code"}
-            
-            if row["is_used"]:
+        
+        if not row:
+            return {"success": False, "error": "Invalid code"}
+        
+        if not row["connected"]:
+            # Nothing was written; report the first check that failed, using the
+            # same database clock the statement validated against
+            if row["used"]:
                 return {"success": False, "error": "Code already used"}
             
-            current_time = datetime.now(timezone.utc)
-            expires_at = row["expires_at"]
-            
-            logger.debug(f"Current time: {current_time}")
-            logger.debug(f"Expires at: {expires_at}")
-            logger.debug(f"Expired: {current_time > expires_at}")
-            
-            if current_time > expires_at:
+            if row["expired"]:
                 return {"success": False, "error": "Code expired"}
             
-            user_id = row["user_id"]
-            
-            # Check if telegram account already connected to another user
-            existing = await conn.fetchrow(
-                """
-                SELECT user_id FROM telegram_connections
-                WHERE telegram_user_id = $1 AND is_active = true
-                """,
-                telegram_user_id
-            )
-            
-            if existing and existing["user_id"] != user_id:
-                return {
-                    "success": False,
-                    "error": "Telegram account already connected to another MemoryVault account"
-                }
-            
-            # Create or update connection
-            await conn.execute(
-                """
-                INSERT INTO telegram_connections (
-                    user_id, telegram_user_id, telegram_username,
-                    telegram_first_name, telegram_last_name, is_active
-                )
-                VALUES ($1, $2, $3, $4, $5, true)
-                ON CONFLICT (telegram_user_id)
-                DO UPDATE SET
-                    user_id = $1,
-                    telegram_username = $3,
-                    telegram_first_name = $4,
-                    telegram_last_name = $5,
-                    is_active = true,
-                    connected_at = NOW()
-                """,
-                user_id, telegram_user_id, telegram_username,
-                telegram_first_name, telegram_last_name
-            )
-            
-            # Mark code as used
-            await conn.execute(
-                """
-                UPDATE telegram_auth_codes
-                SET is_used = true
-                WHERE code = $1
-                """,
-                auth_code
-            )
+            return {
+                "success": False,
+                "error": "Telegram account already connected to another MemoryVault account"
+            }
+        
+        user_id = row["user_id"]
+        
+        await self._invalidate_status(telegram_user_id)
         
         logger.info(f"Connected Telegram user {telegram_user_id} to MemoryVault user {user_id}")
         return {"success": True, "user_id": user_id}
     
-    async def is_user_connected(self, telegram_user_id: str, db: asyncpg.Pool) -> bool:
+    async def is_user_connected(self, telegram_user_id: str, db: PoolOrConnection) -> bool:
         """Check if Telegram user is connected"""
-        async with db.acquire() as conn:
-            row = await conn.fetchrow(
-                """
-                SELECT user_id FROM telegram_connections
-                WHERE telegram_user_id = $1 AND is_active = true
-                """,
-                telegram_user_id
-            )
-            return row is not None
+        status = await self.get_connection_status_by_telegram(telegram_user_id, db)
+        return status["connected"]
     
     async def get_connection_status(
-        self, user_id: str, db: asyncpg.Pool
+        self, user_id: str, db: PoolOrConnection
     ) -> Dict[str, Any]:
         """Get connection status for MemoryVault user"""
-        async with db.acquire() as conn:
+        async with acquire(db) as conn:
             row = await conn.fetchrow(
                 """
                 SELECT
@@ -191,10 +264,34 @@ class AuthService:
             }
     
     async def get_connection_status_by_telegram(
-        self, telegram_user_id: str, db: asyncpg.Pool
+        self, telegram_user_id: str, db: PoolOrConnection
     ) -> Dict[str, Any]:
         """Get connection status by Telegram user ID"""
-        async with db.acquire() as conn:
+        status = await self.get_cached_status_by_telegram(telegram_user_id)
+        if status is not None:
+            return status
+        return await self.load_status_by_telegram(telegram_user_id, db)
+    
+    async def get_cached_status_by_telegram(
+        self, telegram_user_id: str
+    ) -> Optional[Dict[str, Any]]:
+        """Get a cached connection status without touching Postgres; None on a miss"""
+        if get_redis() is None:
+            cached = self._status_cache.get(telegram_user_id)
+            return dict(cached) if cached is not None else None
+        
+        # Shared tier: one GET instead of a Postgres round trip on other workers;
+        # /disconnect tombstones these keys, so every process sees it immediately
+        status = await self._get_shared_status(telegram_user_id)
+        return dict(status) if status is not None else None
+    
+    async def load_status_by_telegram(
+        self, telegram_user_id: str, db: PoolOrConnection
+    ) -> Dict[str, Any]:
+        """Read a connection status from Postgres and cache it"""
+        use_local = get_redis() is None
+        generation = self._status_generation
+        async with acquire(db) as conn:
             row = await conn.fetchrow(
                 """
                 SELECT user_id, connected_at, is_active
@@ -203,28 +300,36 @@ class AuthService:
                 """,
                 telegram_user_id
             )
-            
-            if not row:
-                return {"connected": False}
-            
-            return {
+        
+        if not row:
+            status = {"connected": False}
+        else:
+            status = {
                 "connected": True,
-                "user_id": row["user_id"],
+                "user_id": str(row["user_id"]),
                 "connected_at": row["connected_at"].isoformat()
             }
+            if use_local and generation == self._status_generation:
+                self._status_cache[telegram_user_id] = status
+        
+        await self._set_shared_status(telegram_user_id, status)
+        return dict(status)
     
-    async def disconnect_user(self, user_id: str, db: asyncpg.Pool) -> bool:
+    async def disconnect_user(self, user_id: str, db: PoolOrConnection) -> bool:
         """Disconnect Telegram account for user"""
-        async with db.acquire() as conn:
-            await conn.execute(
+        async with acquire(db) as conn:
+            rows = await conn.fetch(
                 """
                 UPDATE telegram_connections
                 SET is_active = false
                 WHERE user_id = $1
+                RETURNING telegram_user_id
                 """,
                 user_id
             )
         
+        await self._invalidate_status(*(row["telegram_user_id"] for row in rows))
+        
         logger.info(f"Disconnected Telegram for user {user_id}")
         return True
 
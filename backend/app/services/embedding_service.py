@@ -3,13 +3,43 @@ Embedding Generation Service
 Generates embeddings for memories using GitHub Models API
 """
 
+import asyncio
+import hashlib
+import math
 import httpx
-from typing import List, Optional
+import orjson
+from cachetools import LRUCache  # type: ignore
+from typing import Dict, List, Optional, Set, Tuple
 from loguru import logger
 
 from app.config import settings
 
 
+# Concurrent single-text requests arriving within this window share one API call
+_BATCH_WINDOW_SECONDS = 0.02
+_MAX_BATCH_SIZE = 32
+# Per-text requests in flight when a batch falls back to one request per item
+_MAX_FALLBACK_REQUESTS = 8
+_CACHE_SIZE = 5000
+
+
+def _cache_key(model: str, text: str) -> bytes:
+    """Compact digest used to key cached embeddings (model-scoped)"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(model.encode())
+    digest.update(b"\0")
+    digest.update(text.encode())
+    return digest.digest()
+
+
+def _normalize(embedding: List[float]) -> List[float]:
+    """Scale to unit length so inner product equals cosine similarity"""
+    norm = math.hypot(*embedding)
+    if not norm or abs(norm - 1.0) < 1e-6:
+        return embedding
+    return [value / norm for value in embedding]
+
+
 class EmbeddingService:
     """Service for generating text embeddings"""
     
@@ -20,44 +50,70 @@ class EmbeddingService:
             "Authorization": f"Bearer {settings.GITHUB_TOKEN}",
             "Content-Type": "application/json"
         }
+        # Shared client keeps TLS connections to the API alive between calls
+        self._client = httpx.AsyncClient(
+            http2=True,
+            timeout=httpx.Timeout(60.0, connect=5.0),
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=50),
+            headers=self.headers,
+        )
+        # Pending (text, future) pairs waiting to be sent as one batch
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._coalescer: Optional[asyncio.Task] = None
+        self._flushes: Set[asyncio.Task] = set()
+        # Repeated inputs ("hi", commands, duplicate titles) skip the network
+        self._cache: LRUCache = LRUCache(maxsize=_CACHE_SIZE)
+        # Identical texts requested concurrently share one pending future
+        self._pending: Dict[bytes, asyncio.Future] = {}
+        self._fallback_slots = asyncio.Semaphore(_MAX_FALLBACK_REQUESTS)
+    
+    async def aclose(self):
+        """Stop the batch coalescer and close the shared HTTP client"""
+        if self._coalescer:
+            self._coalescer.cancel()
+            await asyncio.gather(self._coalescer, return_exceptions=True)
+            self._coalescer = None
+        # Texts still queued won't be sent; release their callers
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_result(None)
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+        await self._client.aclose()
     
     async def generate_embedding(self, text: str) -> Optional[List[float]]:
         """
         Generate embedding for a single text
+        Requests from concurrent callers are coalesced into batched API calls
         Returns embedding vector or None if failed
         """
         if not text or not text.strip():
             logger.warning("Empty text provided for embedding")
             return None
         
-        try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.endpoint}/embeddings",
-                    headers=self.headers,
-                    json={
-                        "model": self.model,
-                        "input": text
-                    },
-                    timeout=30.0
-                )
-                
-                if response.status_code != 200:
-                    logger.error(f"Embedding API error: {response.status_code} - {response.text}")
-                    return None
-                
-                data = response.json()
-                embedding = data["data"][0]["embedding"]
-                
-                logger.debug(f"Generated embedding with {len(embedding)} dimensions")
-                return embedding
-                
-        except httpx.TimeoutException:
-            logger.error("Embedding API request timeout")
-            return None
-        except Exception as e:
-            logger.error(f"Error generating embedding: {e}")
-            return None
+        key = _cache_key(self.model, text)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+        
+        pending = self._pending.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        
+        if self._coalescer is None or self._coalescer.done():
+            self._coalescer = asyncio.create_task(self._coalesce())
+        
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        future.add_done_callback(lambda _: self._pending.pop(key, None))
+        await self._queue.put((text, future))
+        # Shield so a cancelled caller doesn't cancel the result for other waiters
+        embedding = await asyncio.shield(future)
+        
+        if embedding is not None:
+            self._cache[key] = embedding
+        return embedding
     
     async def generate_embeddings_batch(
         self, texts: List[str]
@@ -69,34 +125,142 @@ class EmbeddingService:
         if not texts:
             return []
         
-        # GitHub Models API supports batch requests
-        try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.endpoint}/embeddings",
-                    headers=self.headers,
-                    json={
-                        "model": self.model,
-                        "input": texts
-                    },
-                    timeout=60.0
-                )
-                
-                if response.status_code != 200:
-                    logger.error(f"Batch embedding API error: {response.status_code}")
-                    # Fallback to individual generation
-                    return [await self.generate_embedding(text) for text in texts]
-                
-                data = response.json()
-                embeddings = [item["embedding"] for item in data["data"]]
-                
+        keys = [_cache_key(self.model, text) for text in texts]
+        results: Dict[bytes, Optional[List[float]]] = {}
+        
+        # Only request unique texts that aren't cached
+        missing: Dict[bytes, str] = {}
+        for key, text in zip(keys, texts):
+            if not text or not text.strip():
+                # One blank input makes the API reject the whole batch
+                results[key] = None
+                continue
+            
+            cached = self._cache.get(key)
+            if cached is not None:
+                results[key] = cached
+            else:
+                missing.setdefault(key, text)
+        
+        if missing:
+            missing_texts = list(missing.values())
+            
+            # GitHub Models API supports batch requests
+            embeddings = await self._request_embeddings(missing_texts, timeout=60.0)
+            
+            if embeddings is None:
+                # Fallback to individual generation, run concurrently
+                embeddings = await self._request_individually(missing_texts)
+            else:
                 logger.info(f"Generated {len(embeddings)} embeddings in batch")
-                return embeddings
-                
+            
+            for key, embedding in zip(missing, embeddings):
+                results[key] = embedding
+                if embedding is not None:
+                    self._cache[key] = embedding
+        
+        # Fan results back out to the original positions
+        return [results[key] for key in keys]
+    
+    async def _coalesce(self):
+        """Collect queued texts for a short window and send them as one request"""
+        while True:
+            batch = [await self._queue.get()]
+            try:
+                await asyncio.sleep(_BATCH_WINDOW_SECONDS)
+            except asyncio.CancelledError:
+                # Shutting down; texts already taken won't be sent
+                for _, future in batch:
+                    if not future.done():
+                        future.set_result(None)
+                raise
+            while len(batch) < _MAX_BATCH_SIZE and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            
+            # Flush in the background so the next window starts collecting immediately
+            task = asyncio.create_task(self._flush(batch))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+    
+    async def _flush(self, batch: List[Tuple[str, asyncio.Future]]):
+        """Send one coalesced batch and resolve each caller's future"""
+        texts = [text for text, _ in batch]
+        
+        try:
+            embeddings = await self._request_embeddings(texts, timeout=30.0)
+            
+            if embeddings is None:
+                if len(texts) == 1:
+                    embeddings = [None]
+                else:
+                    # One bad input fails the whole batch; retry items individually
+                    embeddings = await self._request_individually(texts)
+            
+            for (_, future), embedding in zip(batch, embeddings):
+                if not future.done():
+                    future.set_result(embedding)
+        finally:
+            # Never leave a caller waiting, even if the flush failed or was cancelled
+            for _, future in batch:
+                if not future.done():
+                    future.set_result(None)
+    
+    async def _request_individually(
+        self, texts: List[str]
+    ) -> List[Optional[List[float]]]:
+        """Request one embedding per text concurrently (None for failed items)"""
+        async def request_one(text: str) -> Optional[List[List[float]]]:
+            async with self._fallback_slots:
+                return await self._request_embeddings([text], timeout=30.0)
+        
+        results = await asyncio.gather(
+            *(request_one(text) for text in texts),
+            return_exceptions=True
+        )
+        return [
+            None if isinstance(result, BaseException) or not result else result[0]
+            for result in results
+        ]
+    
+    async def _request_embeddings(
+        self, texts: List[str], timeout: float
+    ) -> Optional[List[List[float]]]:
+        """
+        Call the embeddings API for a list of inputs
+        Returns embeddings in input order or None if the request failed
+        """
+        try:
+            response = await self._client.post(
+                f"{self.endpoint}/embeddings",
+                json={
+                    "model": self.model,
+                    "input": texts
+                },
+                timeout=timeout
+            )
+            
+            if response.status_code != 200:
+                logger.error(f"Embedding API error: {response.status_code} - {response.text}")
+                return None
+            
+            data = orjson.loads(response.content)
+            items = sorted(data["data"], key=lambda item: item["index"])
+            embeddings = [_normalize(item["embedding"]) for item in items]
+            
+            # Results are matched to inputs by position, so a short reply is a failure
+            if len(embeddings) != len(texts):
+                logger.error(f"Embedding API returned {len(embeddings)} embeddings for {len(texts)} inputs")
+                return None
+            
+            logger.debug(f"Generated {len(embeddings)} embeddings with {len(embeddings[0])} dimensions")
+            return embeddings
+            
+        except httpx.TimeoutException:
+            logger.error("Embedding API request timeout")
+            return None
         except Exception as e:
-            logger.error(f"Error in batch embedding generation: {e}")
-            # Fallback to individual generation
-            return [await self.generate_embedding(text) for text in texts]
+            logger.error(f"Error generating embeddings: {e}")
+            return None
 
 
 # Global service instance
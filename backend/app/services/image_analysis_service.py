@@ -4,27 +4,21 @@ Analyzes images using GitHub Models API (GPT-4o vision)
 """
 
 import base64
-import json
+import re
 from typing import Dict, Any, Optional
 from loguru import logger  # type: ignore
 import httpx  # type: ignore
+import orjson  # type: ignore
 
 from app.config import settings
 
+# A JSON object inside a markdown code fence; tried first so braces in
+# surrounding prose can't pull the fence markers into the match
+_FENCED_JSON_RE = re.compile(r"```(?:json)?\s*(\{.*?\})\s*```", re.DOTALL)
+# The outermost bare object, used only when the reply has no fence
+_BARE_JSON_RE = re.compile(r"\{.*\}", re.DOTALL)
 
-async def analyze_image_from_url(image_url: str, filename: str = "image") -> Dict[str, Any]:
-    """
-    Analyze an image from a URL using GPT-4o vision model
-    
-    Args:
-        image_url: URL to the image (can be Telegram file URL)
-        filename: Original filename for context
-    
-    Returns:
-        Dictionary with title, content, tags, category, and confidence
-    """
-    try:
-        prompt = """Analyze this image and provide the following in JSON format:
+_VISION_PROMPT = """Analyze this image and provide the following in JSON format:
 1. A concise, descriptive title (max 100 chars)
 2. A detailed description of what's in the image (max 500 chars)
 3. 3-5 relevant tags/keywords
@@ -41,42 +35,70 @@ Respond ONLY with valid JSON in this exact structure:
 
 Be specific and accurate. The confidence score should be between 0 and 1."""
 
+_VISION_URL = f"{settings.GITHUB_MODELS_ENDPOINT}/chat/completions"
+
+_VISION_HEADERS = {
+    "Content-Type": "application/json",
+    "Authorization": f"Bearer {settings.GITHUB_TOKEN}",
+}
+
+_PROMPT_PART = {
+    "type": "text",
+    "text": _VISION_PROMPT,
+}
+
+_REQUEST_TEMPLATE = {
+    "model": "gpt-4o",
+    "max_tokens": 1000,
+    "temperature": 0.7,
+}
+
+
+def _build_vision_request(image_url: str) -> Dict[str, Any]:
+    """Build the chat completion payload, patching only the image URL per call"""
+    return {
+        **_REQUEST_TEMPLATE,
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    _PROMPT_PART,
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": image_url,
+                        },
+                    },
+                ],
+            }
+        ],
+    }
+
+
+async def analyze_image_from_url(image_url: str, filename: str = "image") -> Dict[str, Any]:
+    """
+    Analyze an image from a URL using GPT-4o vision model
+    
+    Args:
+        image_url: URL to the image (can be Telegram file URL)
+        filename: Original filename for context
+    
+    Returns:
+        Dictionary with title, content, tags, category, and confidence
+    """
+    try:
         async with httpx.AsyncClient(timeout=30.0) as client:
             response = await client.post(
-                f"{settings.GITHUB_MODELS_ENDPOINT}/chat/completions",
-                headers={
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {settings.GITHUB_TOKEN}",
-                },
-                json={
-                    "model": "gpt-4o",
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": [
-                                {
-                                    "type": "text",
-                                    "text": prompt,
-                                },
-                                {
-                                    "type": "image_url",
-                                    "image_url": {
-                                        "url": image_url,
-                                    },
-                                },
-                            ],
-                        }
-                    ],
-                    "max_tokens": 1000,
-                    "temperature": 0.7,
-                },
+                _VISION_URL,
+                headers=_VISION_HEADERS,
+                json=_build_vision_request(image_url),
             )
 
         if response.status_code != 200:
             logger.error(f"Vision API error: {response.text}")
             return _fallback_analysis(filename)
 
-        data = response.json()
+        data = orjson.loads(response.content)
         assistant_message = data.get("choices", [{}])[0].get("message", {}).get("content")
 
         if not assistant_message:
@@ -85,21 +107,15 @@ Be specific and accurate. The confidence score should be between 0 and 1."""
         # Parse JSON response
         try:
             # Extract JSON from response (in case wrapped in markdown)
-            if "```json" in assistant_message:
-                json_str = assistant_message.split("```json")[1].split("```")[0].strip()
-            elif "```" in assistant_message:
-                json_str = assistant_message.split("```")[1].split("```")[0].strip()
+            match = _FENCED_JSON_RE.search(assistant_message)
+            if match:
+                json_str = match.group(1)
             else:
-                json_str = assistant_message.strip()
+                match = _BARE_JSON_RE.search(assistant_message)
+                json_str = match.group(0) if match else assistant_message.strip()
             
-            # Try to find JSON object
-            if "{" in json_str and "}" in json_str:
-                start = json_str.index("{")
-                end = json_str.rindex("}") + 1
-                json_str = json_str[start:end]
-            
-            analysis = json.loads(json_str)
-        except json.JSONDecodeError as e:
+            analysis = orjson.loads(json_str)
+        except orjson.JSONDecodeError as e:
             logger.error(f"Failed to parse AI response: {e}\nResponse: {assistant_message}")
             return _fallback_analysis(filename, assistant_message)
 
@@ -125,6 +141,9 @@ async def analyze_image_from_bytes(
     """
     Analyze an image from raw bytes
     
+    Inlines the image as a base64 data URL (+33% size), so prefer
+    analyze_image_from_url whenever the image has a hosted URL.
+    
     Args:
         image_bytes: Raw image bytes
         mime_type: MIME type of the image
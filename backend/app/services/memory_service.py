@@ -3,25 +3,223 @@ Memory Management Service
 Handles memory CRUD operations and synchronization with Supabase
 """
 
-from typing import List, Dict, Any, Optional
-from datetime import datetime
-import asyncpg
+import asyncio
+import re
+import uuid
+from typing import List, Dict, Any, Optional, Sequence, Set, Tuple
+from datetime import datetime, timezone
 from loguru import logger
 
+from app.database import PoolOrConnection, acquire, vector_search
 from app.services.embedding_service import embedding_service
 from app.services.storage_service import storage_service
 
 
+# Concurrent single-memory writes within this window share one COPY
+_WRITE_WINDOW_SECONDS = 0.1
+_MAX_WRITE_BATCH = 50
+# created_at and index_position are filled by the column default and insert trigger
+_WRITE_COLUMNS = ["id", "user_id", "title", "content", "type", "embedding", "source"]
+
+# ~8K tokens, the embedding model's input limit
+_MAX_EMBED_CHARS = 32000
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def _prep_embed_text(title: str, content: Optional[str]) -> str:
+    """Collapse whitespace and cap length so embedding input stays within the model window"""
+    text = f"{title} {content or ''}"
+    return _WHITESPACE_RE.sub(" ", text).strip()[:_MAX_EMBED_CHARS]
+
+
+# Hot statements are kept as constants so every call sends identical SQL text,
+# which is what asyncpg keys its per-connection prepared statement cache on
+# Insert memory and file record in one statement, so neither can be
+# written without the other
+_INSERT_MEMORY_WITH_FILE_SQL = """
+    WITH memory AS (
+        INSERT INTO memories (
+            user_id, title, content, type, embedding, source, created_at
+        )
+        VALUES ($1, $2, $3, 'file', $4, $5, NOW())
+        RETURNING id
+    )
+    INSERT INTO memory_files (
+        memory_id, file_name, file_path, file_type, file_size, telegram_file_unique_id
+    )
+    SELECT id, $6, $7, $8, $9, $10 FROM memory
+    RETURNING memory_id
+"""
+
+# Telegram's file_unique_id is stable across re-sends and forwards of the same file
+_UPLOADED_FILE_SQL = """
+    SELECT f.file_path, f.file_size
+    FROM memory_files f
+    JOIN memories m ON m.id = f.memory_id
+    WHERE f.telegram_file_unique_id = $2 AND m.user_id = $1
+    LIMIT 1
+"""
+
+_RECENT_MEMORIES_SQL = """
+    SELECT id, title, content, created_at, source
+    FROM memories
+    WHERE user_id = $1
+    ORDER BY created_at DESC
+    LIMIT $2
+"""
+
+# Connection check and listing in one round trip: no row means not connected,
+# a single row with NULL id means connected with no memories. Listings only
+# show the start of a title, so the bounded title_preview is read and the
+# covering index answers the lateral without heap fetches
+_TELEGRAM_RECENT_TITLES_SQL = """
+    SELECT m.id, m.title, m.created_at, m.source
+    FROM telegram_connections c
+    LEFT JOIN LATERAL (
+        SELECT id, title_preview AS title, created_at, source
+        FROM memories
+        WHERE user_id = c.user_id
+        ORDER BY created_at DESC
+        LIMIT $2
+    ) m ON true
+    WHERE c.telegram_user_id = $1 AND c.is_active = true
+    ORDER BY m.created_at DESC
+"""
+
+# Embeddings are unit length, so the negated inner product is the cosine
+# similarity without per-row norms
+_SEMANTIC_SEARCH_SQL = """
+    SELECT
+        id, title, content, created_at,
+        (embedding <#> $2::halfvec) * -1 as similarity
+    FROM memories
+    WHERE user_id = $1 AND embedding IS NOT NULL
+    ORDER BY embedding <#> $2::halfvec
+    LIMIT $3
+"""
+
+_TEXT_SEARCH_SQL = """
+    SELECT id, title, content, created_at
+    FROM memories
+    WHERE user_id = $1
+    AND (
+        title ILIKE $2 OR content ILIKE $2
+    )
+    ORDER BY created_at DESC
+    LIMIT $3
+"""
+
+_MEMORY_COUNT_SQL = """
+    SELECT COUNT(*) FROM memories WHERE user_id = $1
+"""
+
+
 class MemoryService:
     """Service for managing memories"""
     
+    def __init__(self):
+        # Pending (db, record, future) rows waiting to be written as one COPY
+        self._write_queue: asyncio.Queue = asyncio.Queue()
+        self._writer: Optional[asyncio.Task] = None
+        self._write_flushes: Set[asyncio.Task] = set()
+    
+    async def aclose(self):
+        """Stop the write batcher after writing every queued row"""
+        if self._writer:
+            self._writer.cancel()
+            await asyncio.gather(self._writer, return_exceptions=True)
+            self._writer = None
+        while not self._write_queue.empty():
+            self._schedule_write_flush(self._take_write_batch([]))
+        if self._write_flushes:
+            await asyncio.gather(*self._write_flushes, return_exceptions=True)
+    
+    async def _write_memory(self, db: PoolOrConnection, record: Tuple) -> uuid.UUID:
+        """Queue one memory row for the next batched COPY and wait until it is written"""
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.create_task(self._write_loop())
+        
+        future = asyncio.get_running_loop().create_future()
+        await self._write_queue.put((db, record, future))
+        return await future
+    
+    def _take_write_batch(self, batch: List[Tuple]) -> List[Tuple]:
+        """Top up a batch from the queue without waiting"""
+        while len(batch) < _MAX_WRITE_BATCH and not self._write_queue.empty():
+            batch.append(self._write_queue.get_nowait())
+        return batch
+    
+    def _schedule_write_flush(self, batch: List[Tuple]):
+        """Write a batch in the background so the next window starts collecting"""
+        task = asyncio.create_task(self._flush_writes(batch))
+        self._write_flushes.add(task)
+        task.add_done_callback(self._write_flushes.discard)
+    
+    async def _write_loop(self):
+        """Collect queued rows for a short window and write them together"""
+        while True:
+            batch = [await self._write_queue.get()]
+            try:
+                await asyncio.sleep(_WRITE_WINDOW_SECONDS)
+            finally:
+                # Also runs on shutdown, so rows already taken are still written
+                self._schedule_write_flush(self._take_write_batch(batch))
+    
+    async def _flush_writes(self, batch: List[Tuple]):
+        """COPY one batch per database handle and resolve each caller's future"""
+        groups: Dict[int, List[Tuple]] = {}
+        for item in batch:
+            groups.setdefault(id(item[0]), []).append(item)
+        
+        for items in groups.values():
+            db = items[0][0]
+            # Flushes can overlap, and each row takes per-user locks (index_position
+            # advisory lock, activity trigger update); a fixed user order keeps two
+            # batches from taking them in opposite orders and deadlocking
+            records = sorted((record for _, record, _ in items), key=lambda record: str(record[1]))
+            try:
+                await self._copy_memories(db, records)
+            except Exception as e:
+                if len(items) == 1:
+                    _, _, future = items[0]
+                    if not future.done():
+                        future.set_exception(e)
+                    continue
+                
+                # One bad row fails the whole COPY; retry rows individually
+                logger.warning(f"Batched memory write failed, retrying per row: {e}")
+                written = 0
+                for _, record, future in items:
+                    try:
+                        await self._copy_memories(db, [record])
+                    except Exception as row_error:
+                        if not future.done():
+                            future.set_exception(row_error)
+                    else:
+                        written += 1
+                        if not future.done():
+                            future.set_result(record[0])
+                
+                logger.debug(f"Wrote {written}/{len(items)} memories row by row")
+            else:
+                for _, record, future in items:
+                    if not future.done():
+                        future.set_result(record[0])
+                
+                logger.debug(f"Wrote {len(items)} memories in one batch")
+    
+    async def _copy_memories(self, db: PoolOrConnection, records: List[Tuple]):
+        """Insert rows with the COPY protocol in a single transaction"""
+        async with acquire(db) as conn:
+            await conn.copy_records_to_table("memories", records=records, columns=_WRITE_COLUMNS)
+    
     async def create_memory_from_telegram(
         self,
         user_id: str,
         title: str,
         content: str,
         source: str,
-        db: asyncpg.Pool
+        db: PoolOrConnection
     ) -> Dict[str, Any]:
         """
         Create a new memory from Telegram
@@ -29,36 +227,16 @@ class MemoryService:
         """
         try:
             # Generate embedding
-            embedding_text = f"{title} {content}"
+            embedding_text = _prep_embed_text(title, content)
             embedding = await embedding_service.generate_embedding(embedding_text)
             
             if not embedding:
                 logger.warning(f"Failed to generate embedding for memory: {title}")
             
-            # Convert embedding list to PostgreSQL vector format
-            embedding_str = None
-            if embedding:
-                embedding_str = f"[{','.join(map(str, embedding))}]"
-            
-            # Insert memory into database
-            async with db.acquire() as conn:
-                # Get next index position for this user
-                max_index = await conn.fetchval(
-                    "SELECT COALESCE(MAX(index_position), 0) FROM memories WHERE user_id = $1",
-                    user_id
-                )
-                next_index = (max_index or 0) + 1
-                
-                memory_id = await conn.fetchval(
-                    """
-                    INSERT INTO memories (
-                        user_id, title, content, type, embedding, index_position, source, created_at
-                    )
-                    VALUES ($1, $2, $3, $4, $5, $6, $7, NOW())
-                    RETURNING id
-                    """,
-                    user_id, title, content, 'text', embedding_str, next_index, source
-                )
+            # Insert memory into database; concurrent creates share one COPY
+            memory_id = await self._write_memory(
+                db, (uuid.uuid4(), user_id, title, content, 'text', embedding, source)
+            )
             
             logger.info(f"Created memory {memory_id} for user {user_id} from {source}")
             return {
@@ -81,22 +259,50 @@ class MemoryService:
         file_type: str,
         content_type: str,
         source: str,
-        db: asyncpg.Pool
+        db: PoolOrConnection,
+        file_unique_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Create a memory with attached file
-        Downloads file from Telegram and uploads to Supabase Storage
+        Downloads file from Telegram and uploads to Supabase Storage,
+        unless the user already saved the same Telegram file
         """
         try:
-            # Process file: download from Telegram and upload to Supabase
-            logger.info(f"Processing file for user {user_id}: {file_name}")
-            upload_result = await storage_service.process_telegram_file(
-                file_path=file_path,
-                user_id=user_id,
-                file_name=file_name,
-                content_type=content_type
+            embed_task = asyncio.create_task(
+                embedding_service.generate_embedding(_prep_embed_text(title, content))
             )
             
+            uploaded = None
+            if file_unique_id:
+                try:
+                    async with acquire(db) as conn:
+                        uploaded = await conn.fetchrow(_UPLOADED_FILE_SQL, user_id, file_unique_id)
+                except BaseException:
+                    # Don't leave the embedding running unobserved
+                    embed_task.cancel()
+                    raise
+            
+            if uploaded:
+                # Same file sent again (e.g. forwarded); reuse the stored object
+                logger.info(f"Reusing uploaded file for user {user_id}: {file_name}")
+                upload_result = {
+                    "success": True,
+                    "public_url": uploaded["file_path"],
+                    "file_size": uploaded["file_size"]
+                }
+                embedding = await embed_task
+            else:
+                # Process file (download from Telegram, upload to Supabase) while
+                # the embedding is generated; the two are independent I/O waits
+                logger.info(f"Processing file for user {user_id}: {file_name}")
+                upload_task = asyncio.create_task(storage_service.process_telegram_file(
+                    file_path=file_path,
+                    user_id=user_id,
+                    file_name=file_name,
+                    content_type=content_type
+                ))
+                upload_result, embedding = await asyncio.gather(upload_task, embed_task)
+            
             if not upload_result["success"]:
                 logger.error(f"File upload failed: {upload_result.get('error')}")
                 # Fallback: create memory without file
@@ -107,44 +313,11 @@ class MemoryService:
             public_url = upload_result["public_url"]
             file_size = upload_result["file_size"]
             
-            # Generate embedding from text content
-            embedding_text = f"{title} {content}"
-            embedding = await embedding_service.generate_embedding(embedding_text)
-            
-            # Convert embedding list to PostgreSQL vector format
-            embedding_str = None
-            if embedding:
-                embedding_str = f"[{','.join(map(str, embedding))}]"
-            
-            # Insert memory with file reference
-            async with db.acquire() as conn:
-                # Get next index position for this user
-                max_index = await conn.fetchval(
-                    "SELECT COALESCE(MAX(index_position), 0) FROM memories WHERE user_id = $1",
-                    user_id
-                )
-                next_index = (max_index or 0) + 1
-                
+            async with acquire(db) as conn:
                 memory_id = await conn.fetchval(
-                    """
-                    INSERT INTO memories (
-                        user_id, title, content, type, embedding, index_position, source, created_at
-                    )
-                    VALUES ($1, $2, $3, $4, $5, $6, $7, NOW())
-                    RETURNING id
-                    """,
-                    user_id, title, content, 'file', embedding_str, next_index, source
-                )
-                
-                # Insert file record
-                await conn.execute(
-                    """
-                    INSERT INTO memory_files (
-                        memory_id, file_name, file_path, file_type, file_size
-                    )
-                    VALUES ($1, $2, $3, $4, $5)
-                    """,
-                    memory_id, file_name, public_url, file_type, file_size
+                    _INSERT_MEMORY_WITH_FILE_SQL,
+                    user_id, title, content, embedding, source,
+                    file_name, public_url, file_type, file_size, file_unique_id
                 )
             
             logger.info(f"Created memory with file {memory_id} for user {user_id}")
@@ -158,33 +331,84 @@ class MemoryService:
             logger.error(f"Error creating memory with file: {e}")
             return {"success": False, "error": str(e)}
     
+    async def bulk_create_memories(
+        self,
+        rows: Sequence[Dict[str, Any]],
+        db: PoolOrConnection
+    ) -> List[uuid.UUID]:
+        """
+        Import many text memories at once
+        Each row needs user_id, title and content; source and created_at are optional
+        Embeddings come from one batched request and rows are loaded with COPY
+        Returns the new memory ids in input order
+        """
+        if not rows:
+            return []
+        
+        embeddings = await embedding_service.generate_embeddings_batch(
+            [_prep_embed_text(row["title"], row["content"]) for row in rows]
+        )
+        
+        now = datetime.now(timezone.utc)
+        memory_ids = [uuid.uuid4() for _ in rows]
+        records = [
+            (
+                memory_id, row["user_id"], row["title"], row["content"], 'text',
+                embedding, row.get("source", "import"), row.get("created_at") or now
+            )
+            for memory_id, row, embedding in zip(memory_ids, rows, embeddings)
+        ]
+        
+        async with acquire(db) as conn:
+            # index_position is still assigned per row by the insert trigger
+            await conn.copy_records_to_table(
+                "memories",
+                records=records,
+                columns=[
+                    "id", "user_id", "title", "content", "type",
+                    "embedding", "source", "created_at"
+                ]
+            )
+        
+        logger.info(f"Imported {len(records)} memories")
+        return memory_ids
+    
     async def get_recent_memories(
         self,
         user_id: str,
         limit: int,
-        db: asyncpg.Pool
+        db: PoolOrConnection
     ) -> List[Dict[str, Any]]:
         """Get recent memories for user"""
-        async with db.acquire() as conn:
-            rows = await conn.fetch(
-                """
-                SELECT id, title, content, created_at, source
-                FROM memories
-                WHERE user_id = $1
-                ORDER BY created_at DESC
-                LIMIT $2
-                """,
-                user_id, limit
-            )
+        async with acquire(db) as conn:
+            rows = await conn.fetch(_RECENT_MEMORIES_SQL, user_id, limit)
             
             return [dict(row) for row in rows]
     
+    async def list_for_telegram_user(
+        self,
+        telegram_user_id: str,
+        limit: int,
+        db: PoolOrConnection
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Get recent memory titles for a connected Telegram user
+        Returns None if the Telegram account is not connected
+        """
+        async with acquire(db) as conn:
+            rows = await conn.fetch(_TELEGRAM_RECENT_TITLES_SQL, telegram_user_id, limit)
+        
+        if not rows:
+            return None
+        
+        return [dict(row) for row in rows if row["id"] is not None]
+    
     async def search_memories(
         self,
         user_id: str,
         query: str,
         limit: int,
-        db: asyncpg.Pool
+        db: PoolOrConnection
     ) -> List[Dict[str, Any]]:
         """
         Search memories using text search
@@ -193,66 +417,82 @@ class MemoryService:
         # Generate query embedding
         query_embedding = await embedding_service.generate_embedding(query)
         
-        # Convert embedding to PostgreSQL vector format
-        query_embedding_str = None
-        if query_embedding:
-            query_embedding_str = f"[{','.join(map(str, query_embedding))}]"
-        
-        async with db.acquire() as conn:
-            if query_embedding_str:
+        async with acquire(db) as conn:
+            if query_embedding:
                 # Semantic search using vector similarity
-                rows = await conn.fetch(
-                    """
-                    SELECT
-                        id, title, content, created_at,
-                        1 - (embedding <=> $2::vector) as similarity
-                    FROM memories
-                    WHERE user_id = $1 AND embedding IS NOT NULL
-                    ORDER BY embedding <=> $2::vector
-                    LIMIT $3
-                    """,
-                    user_id, query_embedding_str, limit
-                )
+                async with vector_search(conn):
+                    rows = await conn.fetch(
+                        _SEMANTIC_SEARCH_SQL, user_id, query_embedding, limit
+                    )
             else:
                 # Fallback to text search
                 rows = await conn.fetch(
-                    """
-                    SELECT id, title, content, created_at
-                    FROM memories
-                    WHERE user_id = $1
-                    AND (
-                        title ILIKE $2 OR content ILIKE $2
-                    )
-                    ORDER BY created_at DESC
-                    LIMIT $3
-                    """,
-                    user_id, f"%{query}%", limit
+                    _TEXT_SEARCH_SQL, user_id, f"%{query}%", limit
                 )
             
             return [dict(row) for row in rows]
     
-    async def get_memory_count(self, user_id: str, db: asyncpg.Pool) -> int:
+    async def search_memories_batch(
+        self,
+        queries: Sequence[Tuple[str, List[float]]],
+        limit: int,
+        db: PoolOrConnection
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Semantic search for many (user_id, query_embedding) pairs in one round trip
+        Returns one result list per query, in input order
+        """
+        if not queries:
+            return []
+        
+        user_ids = [user_id for user_id, _ in queries]
+        embeddings = [embedding for _, embedding in queries]
+        
+        async with acquire(db) as conn:
+            async with vector_search(conn):
+                rows = await conn.fetch(
+                    """
+                    SELECT
+                        q.ord, m.id, m.title, m.content, m.created_at, m.similarity
+                    FROM unnest($1::uuid[], $2::halfvec[])
+                        WITH ORDINALITY AS q(query_user_id, query_embedding, ord)
+                    CROSS JOIN LATERAL (
+                        SELECT
+                            id, title, content, created_at,
+                            (embedding <#> q.query_embedding) * -1 as similarity
+                        FROM memories
+                        WHERE user_id = q.query_user_id AND embedding IS NOT NULL
+                        ORDER BY embedding <#> q.query_embedding
+                        LIMIT $3
+                    ) m
+                    ORDER BY q.ord, m.similarity DESC
+                    """,
+                    user_ids, embeddings, limit
+                )
+        
+        results: List[List[Dict[str, Any]]] = [[] for _ in queries]
+        for row in rows:
+            memory = dict(row)
+            results[memory.pop("ord") - 1].append(memory)
+        return results
+    
+    async def get_memory_count(self, user_id: str, db: PoolOrConnection) -> int:
         """Get total memory count for user"""
-        async with db.acquire() as conn:
-            count = await conn.fetchval(
-                """
-                SELECT COUNT(*) FROM memories WHERE user_id = $1
-                """,
-                user_id
-            )
+        async with acquire(db) as conn:
+            count = await conn.fetchval(_MEMORY_COUNT_SQL, user_id)
             return count or 0
     
     async def update_memory_embedding(
         self,
         memory_id: str,
-        db: asyncpg.Pool
+        db: PoolOrConnection
     ) -> bool:
         """
         Regenerate embedding for a specific memory
         Useful for backfilling embeddings
         """
         try:
-            async with db.acquire() as conn:
+            async with acquire(db) as conn:
                 # Get memory
                 row = await conn.fetchrow(
                     """
@@ -266,7 +506,7 @@ class MemoryService:
                     return False
                 
                 # Generate embedding
-                embedding_text = f"{row['title']} {row['content']}"
+                embedding_text = _prep_embed_text(row["title"], row["content"])
                 embedding = await embedding_service.generate_embedding(embedding_text)
                 
                 if not embedding:
@@ -289,6 +529,68 @@ class MemoryService:
         except Exception as e:
             logger.error(f"Error updating memory embedding: {e}")
             return False
+    
+    async def backfill_embeddings(
+        self,
+        db: PoolOrConnection,
+        batch_size: int = 256
+    ) -> int:
+        """
+        Generate embeddings for all memories that don't have one
+        Uses one batched embedding request and one pipelined update per batch
+        Returns number of memories updated
+        """
+        updated = 0
+        last_id = None
+        
+        while True:
+            async with acquire(db) as conn:
+                # Keyset pagination so rows whose embedding keeps failing aren't re-read
+                rows = await conn.fetch(
+                    """
+                    SELECT id, title, content FROM memories
+                    WHERE embedding IS NULL
+                    AND ($1::uuid IS NULL OR id > $1::uuid)
+                    ORDER BY id
+                    LIMIT $2
+                    """,
+                    last_id, batch_size
+                )
+            
+            if not rows:
+                break
+            
+            last_id = rows[-1]["id"]
+            
+            embeddings = await embedding_service.generate_embeddings_batch(
+                [_prep_embed_text(row["title"], row["content"]) for row in rows]
+            )
+            
+            records = [
+                (embedding, row["id"])
+                for row, embedding in zip(rows, embeddings)
+                if embedding
+            ]
+            
+            if records:
+                async with acquire(db) as conn:
+                    await conn.executemany(
+                        """
+                        UPDATE memories
+                        SET embedding = $1
+                        WHERE id = $2
+                        """,
+                        records
+                    )
+                updated += len(records)
+            
+            logger.info(f"Backfilled {len(records)}/{len(rows)} embeddings in batch")
+            
+            if len(rows) < batch_size:
+                break
+        
+        logger.info(f"Backfilled embeddings for {updated} memories")
+        return updated
 
 
 # Global service instance
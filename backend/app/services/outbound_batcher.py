@@ -0,0 +1,149 @@
+"""
+Outbound Message Batcher
+Groups Telegram sendMessage calls per chat and paces them under Telegram's flood limits
+"""
+
+import asyncio
+from collections import defaultdict
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from telegram import Bot, Message  # type: ignore
+from telegram.error import RetryAfter  # type: ignore
+from loguru import logger  # type: ignore
+
+
+# Messages queued within this window are flushed together
+_FLUSH_WINDOW_SECONDS = 0.05
+# Stay under Telegram's ~30 messages/second global limit; starts are spaced
+# this far apart, and RetryAfter covers the per-chat limits
+_SEND_INTERVAL_SECONDS = 1 / 30
+# Bounds in-flight requests only, not the send rate
+_MAX_CONCURRENT_SENDS = 25
+_MAX_ATTEMPTS = 3
+
+_Outgoing = Tuple[int, str, Dict[str, Any], asyncio.Future]
+
+
+class OutboundBatcher:
+    """
+    Sends queued messages in small time windows
+    Chats are flushed concurrently; messages within a chat are sent in order,
+    and a RetryAfter only pauses the chat that triggered it
+    """
+    
+    def __init__(self, bot: Bot):
+        self.bot = bot
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._semaphore = asyncio.Semaphore(_MAX_CONCURRENT_SENDS)
+        # Loop time at which the next send may start
+        self._next_send_at = 0.0
+        self._flusher: Optional[asyncio.Task] = None
+        # Latest send task per chat; the next flush for that chat waits on it
+        self._chat_tails: Dict[int, asyncio.Task] = {}
+    
+    def start(self):
+        """Start the background flush loop"""
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_loop())
+    
+    async def stop(self):
+        """Stop the flush loop and send anything still queued"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        
+        self._dispatch(self._drain())
+        if self._chat_tails:
+            await asyncio.gather(*self._chat_tails.values(), return_exceptions=True)
+    
+    async def send(self, chat_id: int, text: str, **kwargs: Any) -> Message:
+        """
+        Queue a message for chat_id
+        Returns the sent Message, or raises the error Telegram returned
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((chat_id, text, kwargs, future))
+        return await future
+    
+    def _drain(self) -> List[_Outgoing]:
+        """Take everything currently queued"""
+        items = []
+        while True:
+            try:
+                items.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                return items
+    
+    async def _flush_loop(self):
+        """Collect messages for one window, then dispatch them per chat"""
+        while True:
+            first = await self._queue.get()
+            try:
+                await asyncio.sleep(_FLUSH_WINDOW_SECONDS)
+            finally:
+                # Also runs on stop(), so the message already taken is still sent
+                self._dispatch([first, *self._drain()])
+    
+    def _dispatch(self, items: List[_Outgoing]):
+        """Start one ordered send task per chat"""
+        by_chat: Dict[int, List[_Outgoing]] = defaultdict(list)
+        for item in items:
+            by_chat[item[0]].append(item)
+        
+        for chat_id, chat_items in by_chat.items():
+            previous = self._chat_tails.get(chat_id)
+            task = asyncio.create_task(self._send_chat(chat_id, chat_items, previous))
+            self._chat_tails[chat_id] = task
+            task.add_done_callback(lambda done, chat_id=chat_id: self._forget_tail(chat_id, done))
+    
+    def _forget_tail(self, chat_id: int, task: asyncio.Task):
+        """Drop the chat's tail once its last send task finishes"""
+        if self._chat_tails.get(chat_id) is task:
+            del self._chat_tails[chat_id]
+    
+    async def _send_chat(
+        self,
+        chat_id: int,
+        items: List[_Outgoing],
+        previous: Optional[asyncio.Task]
+    ):
+        """Send one chat's messages in order, after its previous batch"""
+        if previous is not None:
+            await asyncio.gather(previous, return_exceptions=True)
+        
+        for _, text, kwargs, future in items:
+            if future.done():
+                # Caller gave up waiting; don't send
+                continue
+            try:
+                message = await self._send_with_retry(chat_id, text, kwargs)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(message)
+    
+    async def _pace(self):
+        """Wait for the next send slot so sends start at most once per interval"""
+        now = asyncio.get_running_loop().time()
+        start = max(now, self._next_send_at)
+        self._next_send_at = start + _SEND_INTERVAL_SECONDS
+        if start > now:
+            await asyncio.sleep(start - now)
+    
+    async def _send_with_retry(self, chat_id: int, text: str, kwargs: Dict[str, Any]) -> Message:
+        """Send one message, waiting out Telegram's RetryAfter for this chat"""
+        for attempt in range(1, _MAX_ATTEMPTS + 1):
+            try:
+                async with self._semaphore:
+                    await self._pace()
+                    return await self.bot.send_message(chat_id=chat_id, text=text, **kwargs)
+            except RetryAfter as e:
+                if attempt == _MAX_ATTEMPTS:
+                    raise
+                delay = e.retry_after
+                seconds = delay.total_seconds() if isinstance(delay, timedelta) else float(delay)
+                logger.warning(f"Flood limit for chat {chat_id}; retrying in {seconds}s")
+                await asyncio.sleep(seconds)
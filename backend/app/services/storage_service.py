@@ -5,13 +5,19 @@ Handles file downloads from Telegram and uploads to Supabase Storage
 
 import os
 import io
-from typing import Dict, Any, Optional
+import time
+from contextlib import aclosing
+from typing import AsyncIterable, AsyncIterator, Dict, Any, Optional, Union
+from urllib.parse import quote
 from loguru import logger
 import httpx
-from supabase import create_client, Client
 from app.config import settings
 
 
+# Files are relayed from Telegram to Supabase in chunks of this size
+_CHUNK_SIZE = 1 << 20
+
+
 class StorageService:
     """Service for managing file storage"""
     
@@ -21,50 +27,69 @@ class StorageService:
         self.bot_token = settings.TELEGRAM_BOT_TOKEN
         self.bucket_name = "telegram-files"
         
-        # Initialize Supabase client
-        self.supabase: Client = create_client(
-            self.supabase_url,
-            self.supabase_key
+        # Shared client reuses TLS connections to Telegram and Supabase across files
+        self._http = httpx.AsyncClient(
+            http2=True,
+            timeout=30.0,
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
         )
     
+    async def aclose(self):
+        """Close the shared HTTP client"""
+        await self._http.aclose()
+    
+    def get_telegram_file_url(self, file_path: str) -> str:
+        """
+        Build the Telegram CDN URL for a file
+        
+        Args:
+            file_path: Telegram file path from file.file_path (can be relative path or full URL)
+        """
+        if file_path.startswith("http"):
+            return file_path
+        return f"https://api.telegram.org/file/bot{self.bot_token}/{file_path}"
+    
+    def get_public_url(self, storage_path: str) -> str:
+        """Build the public URL of an object in the storage bucket"""
+        return f"{self.supabase_url}/storage/v1/object/public/{self.bucket_name}/{quote(storage_path)}"
+    
     async def download_telegram_file(
         self,
         file_path: str
-    ) -> Optional[bytes]:
+    ) -> AsyncIterator[bytes]:
         """
-        Download file from Telegram servers
+        Stream a file from Telegram servers
         
         Args:
             file_path: Telegram file path from file.file_path (can be relative path or full URL)
             
-        Returns:
-            File bytes or None if download fails
+        Yields:
+            File content in chunks; raises httpx.HTTPError if the download fails
+            and ValueError if the file exceeds MAX_FILE_SIZE_BYTES
         """
-        try:
-            # Check if file_path is already a full URL or just a relative path
-            if file_path.startswith("http"):
-                file_url = file_path
-            else:
-                file_url = f"https://api.telegram.org/file/bot{self.bot_token}/{file_path}"
+        file_url = self.get_telegram_file_url(file_path)
+        max_size = settings.MAX_FILE_SIZE_BYTES
+        
+        logger.debug(f"Downloading file from Telegram: {file_url}")
+        
+        async with self._http.stream("GET", file_url) as response:
+            response.raise_for_status()
             
-            logger.debug(f"Downloading file from Telegram: {file_url}")
+            # Reject oversized files before relaying a single chunk
+            content_length = int(response.headers.get("Content-Length") or 0)
+            if content_length > max_size:
+                raise ValueError(f"File too large: {content_length} bytes")
             
-            # Download file
-            async with httpx.AsyncClient() as client:
-                response = await client.get(file_url, timeout=30.0)
-                response.raise_for_status()
-                
-                file_bytes = response.content
-                logger.info(f"Downloaded {len(file_bytes)} bytes from Telegram")
-                return file_bytes
-                
-        except Exception as e:
-            logger.error(f"Error downloading file from Telegram: {e}")
-            return None
+            received = 0
+            async for chunk in response.aiter_bytes(_CHUNK_SIZE):
+                received += len(chunk)
+                if received > max_size:
+                    raise ValueError(f"File too large: over {max_size} bytes")
+                yield chunk
     
-    def upload_to_supabase(
+    async def upload_to_supabase(
         self,
-        file_bytes: bytes,
+        content: Union[bytes, AsyncIterable[bytes]],
         user_id: str,
         file_name: str,
         content_type: str
@@ -73,7 +98,7 @@ class StorageService:
         Upload file to Supabase Storage
         
         Args:
-            file_bytes: File content as bytes
+            content: File content as bytes or an async stream of chunks
             user_id: User ID for organizing files
             file_name: Original file name
             content_type: MIME type of file
@@ -83,21 +108,26 @@ class StorageService:
         """
         try:
             # Generate unique file path: user_id/timestamp_filename
-            import time
             timestamp = int(time.time())
             storage_path = f"{user_id}/{timestamp}_{file_name}"
             
             logger.debug(f"Uploading to Supabase Storage: {storage_path}")
             
-            # Upload to Supabase Storage
-            response = self.supabase.storage.from_(self.bucket_name).upload(
-                path=storage_path,
-                file=file_bytes,
-                file_options={"content-type": content_type}
+            # Upload through the Storage REST API; httpx streams async content
+            response = await self._http.post(
+                f"{self.supabase_url}/storage/v1/object/{self.bucket_name}/{quote(storage_path)}",
+                content=content,
+                headers={
+                    "Authorization": f"Bearer {self.supabase_key}",
+                    "apikey": self.supabase_key,
+                    "Content-Type": content_type,
+                    "x-upsert": "false",
+                },
             )
+            response.raise_for_status()
             
-            # Get public URL
-            public_url = self.supabase.storage.from_(self.bucket_name).get_public_url(storage_path)
+            # Public URL is deterministic for a public bucket, no round trip needed
+            public_url = self.get_public_url(storage_path)
             
             logger.info(f"File uploaded successfully: {public_url}")
             return public_url
@@ -114,7 +144,8 @@ class StorageService:
         content_type: str
     ) -> Dict[str, Any]:
         """
-        Complete flow: Download from Telegram and upload to Supabase
+        Complete flow: Stream from Telegram into Supabase
+        Download and upload overlap, so memory stays bounded by the chunk size
         
         Args:
             file_path: Telegram file path
@@ -125,31 +156,31 @@ class StorageService:
         Returns:
             Dict with success status and public_url or error
         """
+        file_size = 0
+        
+        async def _relay():
+            nonlocal file_size
+            async with aclosing(self.download_telegram_file(file_path)) as chunks:
+                async for chunk in chunks:
+                    file_size += len(chunk)
+                    yield chunk
+        
         try:
-            # Download from Telegram
-            file_bytes = await self.download_telegram_file(file_path)
-            
-            if not file_bytes:
-                return {
-                    "success": False,
-                    "error": "Failed to download file from Telegram"
-                }
-            
-            # Upload to Supabase
-            public_url = self.upload_to_supabase(
-                file_bytes, user_id, file_name, content_type
+            public_url = await self.upload_to_supabase(
+                _relay(), user_id, file_name, content_type
             )
             
             if not public_url:
                 return {
                     "success": False,
-                    "error": "Failed to upload file to storage"
+                    "error": "Failed to transfer file from Telegram to storage"
                 }
             
+            logger.info(f"Relayed {file_size} bytes from Telegram to storage")
             return {
                 "success": True,
                 "public_url": public_url,
-                "file_size": len(file_bytes)
+                "file_size": file_size
             }
             
         except Exception as e:
@@ -4,22 +4,146 @@ Handles all bot interactions and command processing
 """
 
 import asyncio
-from typing import Optional, Dict, Any
-from telegram import Update, Bot, InlineKeyboardButton, InlineKeyboardMarkup  # type: ignore
+import re
+import time
+from datetime import date
+from functools import lru_cache
+from typing import Optional, Dict, Any, List, Callable, Awaitable
+from telegram import Update, Bot, File, Message, PhotoSize, InlineKeyboardButton, InlineKeyboardMarkup  # type: ignore
+from telegram.constants import ParseMode  # type: ignore
 from telegram.ext import (  # type: ignore
     Application,
+    ApplicationHandlerStop,
+    CallbackQueryHandler,
     CommandHandler,
     MessageHandler,
+    TypeHandler,
     filters,
     ContextTypes,
 )
+from telegram.error import TelegramError  # type: ignore
+from telegram.request import HTTPXRequest  # type: ignore
 from loguru import logger  # type: ignore
+import orjson  # type: ignore
+from cachetools import TTLCache  # type: ignore
 
 from app.config import settings
+from app.cache import get_redis
 from app.services.auth_service import auth_service
 from app.services.memory_service import memory_service
+from app.services.storage_service import storage_service
+from app.services.outbound_batcher import OutboundBatcher
 from app.services.image_analysis_service import analyze_image_from_url
-from app.database import get_db_pool
+from app.database import PoolOrConnection, get_db_pool, acquire
+
+
+# Per-chat workers exit after this long without work
+_CHAT_WORKER_IDLE_SECONDS = 60.0
+
+
+# Local fallback for per-second rate counters when Redis isn't configured
+_RATE_COUNTER_SIZE = 10_000
+
+# Static replies are built once at import instead of on every command
+_WELCOME_TEMPLATE = """👋 Welcome to **MemoryVault Bot**, {first_name}!
+
+I help you manage your memories directly from Telegram.
+
+**Getting Started:**
+1. Connect your MemoryVault account using `/connect <code>`
+2. Get your connection code from the MemoryVault app (Integrations page)
+
+**Available Commands:**
+/connect - Link your MemoryVault account
+/status - Check connection status
+/add - Add a new memory
+/list - View recent memories
+/search - Search memories
+/help - Show this help message
+
+Let's get started! 🚀"""
+
+_HELP_TEXT = """📖 **MemoryVault Bot Commands**
+
+**Account Management:**
+/connect <code> - Link your MemoryVault account
+/status - Check connection status
+
+**Memory Management:**
+/add - Instructions to add memories
+/list - View recent memories (last 10)
+/search <query> - Search your memories
+
+**Other:**
+/help - Show this help message
+
+**Quick Tips:**
+• Send any text to create a memory
+• Send photos with captions
+• Send documents or files
+• All memories are automatically synced with your MemoryVault app
+
+Need help? Visit: {base_url}""".format(base_url=settings.APP_BASE_URL)
+
+_ADD_TEXT = (
+    "📝 **Add a Memory**\n\n"
+    "Simply send me:\n"
+    "• Text message for a text memory\n"
+    "• Photo with caption\n"
+    "• Document/file\n\n"
+    "I'll save it to your MemoryVault automatically!"
+)
+
+_NOT_CONNECTED_TEXT = (
+    "❌ Please connect your account first using `/connect <code>`\n\n"
+    f"Get your code from: {settings.APP_BASE_URL}/integrations"
+)
+
+_MEMORY_SAVED_TEXT = (
+    "✅ Memory saved!\n\n"
+    f"🔗 View in app: {settings.APP_BASE_URL}/memories"
+)
+
+# Longest prefix of up to 100 chars that ends on a word boundary
+_TITLE_RE = re.compile(r"^.{1,100}\b", re.S)
+# Shorter word-boundary cuts (e.g. "a " before a long URL) lose too much of the title
+_MIN_TITLE_CUT = 60
+
+# Shared by /start and /help; buttons dispatch to the matching command via callback_data
+_MENU_KEYBOARD = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("📝 Add", callback_data="add"),
+        InlineKeyboardButton("📊 Status", callback_data="status"),
+        InlineKeyboardButton("📖 Help", callback_data="help"),
+    ],
+])
+
+
+def _title_from_text(text: str) -> str:
+    """Use the first 100 chars as a title, cutting long text at a word boundary"""
+    if len(text) <= 100:
+        return text
+    match = _TITLE_RE.match(text)
+    title = match.group(0) if match and len(match.group(0)) >= _MIN_TITLE_CUT else text[:100]
+    return title.rstrip()
+
+
+@lru_cache(maxsize=4096)
+def _fmt_date(year: int, month: int, day: int) -> str:
+    """Format a memory date for replies; the same days recur across users"""
+    return date(year, month, day).strftime("%b %d, %Y")
+
+
+class _OrjsonRequest(HTTPXRequest):
+    """HTTPXRequest that parses Bot API responses with orjson"""
+    
+    @staticmethod
+    def parse_json_payload(payload: bytes) -> Dict[str, Any]:
+        try:
+            return orjson.loads(payload)
+        except orjson.JSONDecodeError as e:
+            logger.error(f"Invalid JSON from Telegram: {payload[:200]!r}")
+            raise TelegramError("Invalid server response") from e
 
 
 class TelegramBotService:
@@ -29,6 +153,18 @@ class TelegramBotService:
         self.bot: Optional[Bot] = None
         self.application: Optional[Application] = None
         self._initialized = False
+        # Replies go through the batcher so bursts respect Telegram's flood limits
+        self.outbound: Optional[OutboundBatcher] = None
+        # Webhook updates are acknowledged immediately and processed by workers
+        self.update_queue: asyncio.Queue = asyncio.Queue(maxsize=settings.WEBHOOK_QUEUE_SIZE)
+        self._workers: List[asyncio.Task] = []
+        # Slow per-chat work (photo analysis) runs in order per chat, off the update workers
+        self._chat_queues: Dict[int, asyncio.Queue] = {}
+        self._chat_workers: Dict[int, asyncio.Task] = {}
+        # Single-flight get_me() call; its first successful result is kept for the process
+        self._bot_info_future: Optional[asyncio.Future] = None
+        # (telegram_user_id, second) -> updates seen; used without Redis
+        self._rate_counters: TTLCache = TTLCache(maxsize=_RATE_COUNTER_SIZE, ttl=2)
     
     async def initialize(self):
         """Initialize the Telegram bot"""
@@ -36,14 +172,28 @@ class TelegramBotService:
             return
         
         try:
-            # Create bot application
+            # Create bot application; HTTP/2 lets concurrent outbound calls
+            # (e.g. a batcher flush) multiplex over one TLS connection
             self.application = (
                 Application.builder()
                 .token(settings.TELEGRAM_BOT_TOKEN)
+                .request(
+                    _OrjsonRequest(
+                        http_version="2",
+                        connection_pool_size=256,
+                        read_timeout=10.0,
+                        write_timeout=10.0,
+                    )
+                )
                 .build()
             )
             
             self.bot = self.application.bot
+            self.outbound = OutboundBatcher(self.bot)
+            
+            # Flood control runs before every other handler (lower group first)
+            if settings.TELEGRAM_RATE_LIMIT_PER_SECOND > 0:
+                self.application.add_handler(TypeHandler(Update, self.check_rate_limit), group=-1)
             
             # Register command handlers
             self.application.add_handler(CommandHandler("start", self.cmd_start))
@@ -53,6 +203,9 @@ class TelegramBotService:
             self.application.add_handler(CommandHandler("list", self.cmd_list))
             self.application.add_handler(CommandHandler("search", self.cmd_search))
             self.application.add_handler(CommandHandler("help", self.cmd_help))
+            self.application.add_handler(
+                CallbackQueryHandler(self.handle_menu_callback, pattern="^(add|status|help)$")
+            )
             
             # Message handlers for adding memories
             self.application.add_handler(
@@ -67,6 +220,13 @@ class TelegramBotService:
             
             # Initialize the application
             await self.application.initialize()
+            self.outbound.start()
+            
+            # Start webhook update workers
+            self._workers = [
+                asyncio.create_task(self._update_worker())
+                for _ in range(settings.WEBHOOK_WORKERS)
+            ]
             
             self._initialized = True
             logger.info("✓ Telegram bot service initialized")
@@ -77,6 +237,33 @@ class TelegramBotService:
     
     async def shutdown(self):
         """Shutdown the bot"""
+        if self._workers:
+            # Give queued updates a chance to finish before stopping workers
+            try:
+                await asyncio.wait_for(self.update_queue.join(), timeout=10)
+            except asyncio.TimeoutError:
+                logger.warning(f"Dropping {self.update_queue.qsize()} queued updates on shutdown")
+            for worker in self._workers:
+                worker.cancel()
+            await asyncio.gather(*self._workers, return_exceptions=True)
+            self._workers = []
+        
+        if self._chat_workers:
+            chat_workers = list(self._chat_workers.values())
+            try:
+                await asyncio.wait_for(
+                    asyncio.gather(*(queue.join() for queue in self._chat_queues.values())),
+                    timeout=10
+                )
+            except asyncio.TimeoutError:
+                logger.warning("Dropping unfinished per-chat jobs on shutdown")
+            for worker in chat_workers:
+                worker.cancel()
+            await asyncio.gather(*chat_workers, return_exceptions=True)
+        
+        if self.outbound:
+            await self.outbound.stop()
+        
         if self.application:
             await self.application.shutdown()
             logger.info("✓ Telegram bot shut down")
@@ -88,6 +275,108 @@ class TelegramBotService:
         except Exception as e:
             logger.error(f"Error processing update: {e}")
     
+    def enqueue_update(self, update: Update):
+        """
+        Queue an update for background processing
+        Raises asyncio.QueueFull when the queue is at capacity
+        """
+        self.update_queue.put_nowait(update)
+    
+    async def _update_worker(self):
+        """Process queued webhook updates"""
+        while True:
+            update = await self.update_queue.get()
+            try:
+                await self.process_update(update)
+            finally:
+                self.update_queue.task_done()
+    
+    def _run_in_chat(self, chat_id: int, job: Callable[[], Awaitable[None]]):
+        """
+        Queue a job behind earlier jobs for the same chat
+        Chats are independent, so one slow chat never delays another
+        """
+        queue = self._chat_queues.get(chat_id)
+        if queue is None:
+            queue = self._chat_queues[chat_id] = asyncio.Queue()
+            self._chat_workers[chat_id] = asyncio.create_task(
+                self._chat_worker(chat_id, queue)
+            )
+        queue.put_nowait(job)
+    
+    async def _chat_worker(self, chat_id: int, queue: asyncio.Queue):
+        """Run one chat's jobs in order; exit once the chat goes idle"""
+        try:
+            while True:
+                try:
+                    job = await asyncio.wait_for(queue.get(), timeout=_CHAT_WORKER_IDLE_SECONDS)
+                except asyncio.TimeoutError:
+                    if queue.empty():
+                        return
+                    continue
+                
+                try:
+                    await job()
+                except Exception as e:
+                    logger.error(f"Error in chat {chat_id} job: {e}")
+                finally:
+                    queue.task_done()
+        finally:
+            self._chat_queues.pop(chat_id, None)
+            self._chat_workers.pop(chat_id, None)
+    
+    async def _reply(self, update: Update, text: str, **kwargs: Any) -> Message:
+        """Send a message to the update's chat through the outbound batcher"""
+        return await self.outbound.send(update.effective_chat.id, text, **kwargs)
+    
+    async def _reply_md(self, update: Update, text: str, **kwargs: Any) -> Message:
+        """
+        Send a Markdown-formatted reply
+        Plain replies go through _reply, so stray _ * ` characters can't fail entity parsing
+        """
+        return await self._reply(update, text, parse_mode=ParseMode.MARKDOWN, **kwargs)
+    
+    async def _count_update(self, telegram_user_id: int) -> int:
+        """Count this user's updates in the current second"""
+        window = int(time.time())
+        redis = get_redis()
+        
+        if redis is not None:
+            key = f"rl:{telegram_user_id}:{window}"
+            try:
+                async with redis.pipeline(transaction=False) as pipe:
+                    pipe.incr(key)
+                    pipe.expire(key, 2)
+                    count, _ = await pipe.execute()
+                return count
+            except Exception as e:
+                logger.warning(f"Redis rate limit check failed: {e}")
+        
+        key = (telegram_user_id, window)
+        count = self._rate_counters.get(key, 0) + 1
+        self._rate_counters[key] = count
+        return count
+    
+    async def check_rate_limit(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Drop updates from users over the per-second limit before any DB work"""
+        user = update.effective_user
+        if user is None:
+            return
+        
+        count = await self._count_update(user.id)
+        limit = settings.TELEGRAM_RATE_LIMIT_PER_SECOND
+        if count <= limit:
+            return
+        
+        # Warn once per window rather than answering every flooded update
+        if count == limit + 1 and update.effective_chat:
+            try:
+                await self.outbound.send(update.effective_chat.id, "⏳ Slow down a little and try again.")
+            except Exception as e:
+                logger.warning(f"Failed to send rate limit notice: {e}")
+        
+        raise ApplicationHandlerStop
+    
     async def set_webhook(self, url: str) -> bool:
         """Set webhook URL"""
         try:
@@ -109,7 +398,21 @@ class TelegramBotService:
             return False
     
     async def get_bot_info(self) -> Optional[Dict[str, Any]]:
-        """Get bot information"""
+        """
+        Get bot information
+        Bot identity doesn't change while the process runs, so the first successful
+        result is memoized; concurrent callers share one in-flight request
+        """
+        future = self._bot_info_future
+        if future is None or (future.done() and future.result() is None):
+            future = asyncio.ensure_future(self._fetch_bot_info())
+            self._bot_info_future = future
+        
+        # Shield so a cancelled caller doesn't cancel the shared request
+        return await asyncio.shield(future)
+    
+    async def _fetch_bot_info(self) -> Optional[Dict[str, Any]]:
+        """Fetch bot information from Telegram"""
         try:
             me = await self.bot.get_me()
             return {
@@ -128,53 +431,33 @@ class TelegramBotService:
         """Handle /start command"""
         user = update.effective_user
         
-        welcome_message = f"""
-👋 Welcome to **MemoryVault Bot**, {user.first_name}!
-
-I help you manage your memories directly from Telegram.
-
-**Getting Started:**
-1. Connect your MemoryVault account using `/connect <code>`
-2. Get your connection code from the MemoryVault app (Integrations page)
-
-**Available Commands:**
-/connect - Link your MemoryVault account
-/status - Check connection status
-/add - Add a new memory
-/list - View recent memories
-/search - Search memories
-/help - Show this help message
-
-Let's get started! 🚀
-        """
-        
-        await update.message.reply_text(
-            welcome_message,
-            parse_mode="Markdown"
+        await self._reply_md(
+            update,
+            _WELCOME_TEMPLATE.format(first_name=user.first_name),
+            reply_markup=_MENU_KEYBOARD
         )
     
     async def cmd_connect(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /connect command"""
         telegram_user_id = str(update.effective_user.id)
-        
-        # Check if already connected
         db = await get_db_pool()
-        is_connected = await auth_service.is_user_connected(telegram_user_id, db)
-        
-        if is_connected:
-            await update.message.reply_text(
-                "✅ You're already connected to MemoryVault!\n\n"
-                "Use /status to check your connection details."
-            )
-            return
         
-        # Get auth code from command args
+        # Get auth code from command args; a code is redeemed without a separate
+        # connection check, so the check only runs to explain a bare /connect
         if not context.args or len(context.args) == 0:
-            await update.message.reply_text(
+            if await auth_service.is_user_connected(telegram_user_id, db):
+                await self._reply(
+                    update,
+                    "✅ You're already connected to MemoryVault!\n\n"
+                    "Use /status to check your connection details."
+                )
+                return
+            
+            await self._reply_md(
+                update,
                 "❌ Please provide an authentication code.\n\n"
                 "**Usage:** `/connect <code>`\n\n"
-                "Get your code from: Settings → Integrations → Telegram",
-                parse_mode="Markdown"
+                "Get your code from: Settings → Integrations → Telegram"
             )
             return
         
@@ -192,25 +475,26 @@ Let's get started! 🚀
             )
             
             if result["success"]:
-                await update.message.reply_text(
+                await self._reply_md(
+                    update,
                     "✅ **Connected Successfully!**\n\n"
                     "Your Telegram account is now linked to MemoryVault.\n\n"
                     "You can now:\n"
                     "• Add memories by sending messages\n"
                     "• View memories with /list\n"
                     "• Search memories with /search\n\n"
-                    "Type /help for more commands.",
-                    parse_mode="Markdown"
+                    "Type /help for more commands."
                 )
             else:
-                await update.message.reply_text(
+                await self._reply_md(
+                    update,
                     f"❌ **Connection Failed**\n\n{result['error']}\n\n"
-                    "Please get a new code from the MemoryVault app.",
-                    parse_mode="Markdown"
+                    "Please get a new code from the MemoryVault app."
                 )
         except Exception as e:
             logger.error(f"Error in connect command: {e}")
-            await update.message.reply_text(
+            await self._reply(
+                update,
                 "❌ An error occurred. Please try again later."
             )
     
@@ -220,91 +504,88 @@ Let's get started! 🚀
         db = await get_db_pool()
         
         try:
-            status = await auth_service.get_connection_status_by_telegram(
-                telegram_user_id, db
-            )
+            status = await auth_service.get_cached_status_by_telegram(telegram_user_id)
+            
+            if status is None:
+                # Cache miss: the status and count queries share one pinned connection
+                async with acquire(db) as conn:
+                    status = await auth_service.load_status_by_telegram(telegram_user_id, conn)
+                    if status["connected"]:
+                        memory_count = await memory_service.get_memory_count(
+                            status["user_id"], conn
+                        )
+            elif status["connected"]:
+                memory_count = await memory_service.get_memory_count(status["user_id"], db)
             
             if status["connected"]:
-                memory_count = await memory_service.get_memory_count(
-                    status["user_id"], db
-                )
-                
-                await update.message.reply_text(
+                await self._reply_md(
+                    update,
                     f"✅ **Connected to MemoryVault**\n\n"
                     f"📊 **Statistics:**\n"
                     f"• Total Memories: {memory_count}\n"
                     f"• Connected Since: {status['connected_at']}\n\n"
-                    f"🔗 Open MemoryVault: {settings.APP_BASE_URL}",
-                    parse_mode="Markdown"
+                    f"🔗 Open MemoryVault: {settings.APP_BASE_URL}"
                 )
             else:
-                await update.message.reply_text(
+                await self._reply_md(
+                    update,
                     "❌ **Not Connected**\n\n"
                     "Use `/connect <code>` to link your account.\n"
-                    "Get your code from the MemoryVault app.",
-                    parse_mode="Markdown"
+                    "Get your code from the MemoryVault app."
                 )
         except Exception as e:
             logger.error(f"Error in status command: {e}")
-            await update.message.reply_text(
+            await self._reply(
+                update,
                 "❌ An error occurred while checking status."
             )
     
     async def cmd_add(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /add command"""
-        await update.message.reply_text(
-            "📝 **Add a Memory**\n\n"
-            "Simply send me:\n"
-            "• Text message for a text memory\n"
-            "• Photo with caption\n"
-            "• Document/file\n\n"
-            "I'll save it to your MemoryVault automatically!",
-            parse_mode="Markdown"
-        )
+        await self._reply_md(update, _ADD_TEXT)
     
     async def cmd_list(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /list command"""
         telegram_user_id = str(update.effective_user.id)
         db = await get_db_pool()
         
-        # Check if connected
-        status = await auth_service.get_connection_status_by_telegram(
-            telegram_user_id, db
-        )
-        
-        if not status["connected"]:
-            await update.message.reply_text(
-                "❌ Please connect your account first using `/connect <code>`",
-                parse_mode="Markdown"
-            )
-            return
-        
         try:
-            # Get recent memories
-            memories = await memory_service.get_recent_memories(
-                status["user_id"], limit=10, db=db
+            # Connection check and recent memories in a single query
+            memories = await memory_service.list_for_telegram_user(
+                telegram_user_id, limit=10, db=db
             )
             
+            if memories is None:
+                await self._reply_md(
+                    update,
+                    "❌ Please connect your account first using `/connect <code>`"
+                )
+                return
+            
             if not memories:
-                await update.message.reply_text(
+                await self._reply(
+                    update,
                     "📭 No memories yet.\n\nSend me a message to create your first memory!"
                 )
                 return
             
-            message = "📚 **Your Recent Memories:**\n\n"
+            parts = ["📚 **Your Recent Memories:**\n\n"]
             
             for i, mem in enumerate(memories, 1):
                 title = mem["title"][:50] + "..." if len(mem["title"]) > 50 else mem["title"]
-                date = mem["created_at"].strftime("%b %d, %Y")
-                message += f"{i}. **{title}**\n   _{date}_\n\n"
+                created = mem["created_at"]
+                day = _fmt_date(created.year, created.month, created.day)
+                parts.append(f"{i}. **{title}**\n   _{day}_\n\n")
             
-            message += f"\n🔗 View all: {settings.APP_BASE_URL}/memories"
+            parts.append(f"\n🔗 View all: {settings.APP_BASE_URL}/memories")
+            message = "".join(parts)
             
-            await update.message.reply_text(message, parse_mode="Markdown")
+            await self._reply_md(update, message)
             
         except Exception as e:
             logger.error(f"Error in list command: {e}")
-            await update.message.reply_text(
+            await self._reply(
+                update,
                 "❌ An error occurred while fetching memories."
             )
     
@@ -319,19 +600,19 @@ Let's get started! 🚀
         )
         
         if not status["connected"]:
-            await update.message.reply_text(
-                "❌ Please connect your account first using `/connect <code>`",
-                parse_mode="Markdown"
+            await self._reply_md(
+                update,
+                "❌ Please connect your account first using `/connect <code>`"
             )
             return
         
         # Get search query
         if not context.args or len(context.args) == 0:
-            await update.message.reply_text(
+            await self._reply_md(
+                update,
                 "🔍 **Search Memories**\n\n"
                 "**Usage:** `/search <query>`\n\n"
-                "**Example:** `/search birthday party`",
-                parse_mode="Markdown"
+                "**Example:** `/search birthday party`"
             )
             return
         
@@ -344,54 +625,47 @@ Let's get started! 🚀
             )
             
             if not results:
-                await update.message.reply_text(
-                    f"🔍 No results found for: *{query}*",
-                    parse_mode="Markdown"
+                await self._reply_md(
+                    update,
+                    f"🔍 No results found for: *{query}*"
                 )
                 return
             
-            message = f"🔍 **Search Results for:** *{query}*\n\n"
+            parts = [f"🔍 **Search Results for:** *{query}*\n\n"]
             
             for i, mem in enumerate(results, 1):
                 title = mem["title"][:50] + "..." if len(mem["title"]) > 50 else mem["title"]
-                date = mem["created_at"].strftime("%b %d, %Y")
-                message += f"{i}. **{title}**\n   _{date}_\n\n"
+                created = mem["created_at"]
+                day = _fmt_date(created.year, created.month, created.day)
+                parts.append(f"{i}. **{title}**\n   _{day}_\n\n")
             
-            await update.message.reply_text(message, parse_mode="Markdown")
+            message = "".join(parts)
+            
+            await self._reply_md(update, message)
             
         except Exception as e:
             logger.error(f"Error in search command: {e}")
-            await update.message.reply_text(
+            await self._reply(
+                update,
                 "❌ An error occurred while searching."
             )
     
     async def cmd_help(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /help command"""
-        help_text = """
-📖 **MemoryVault Bot Commands**
-
-**Account Management:**
-/connect <code> - Link your MemoryVault account
-/status - Check connection status
-
-**Memory Management:**
-/add - Instructions to add memories
-/list - View recent memories (last 10)
-/search <query> - Search your memories
-
-**Other:**
-/help - Show this help message
-
-**Quick Tips:**
-• Send any text to create a memory
-• Send photos with captions
-• Send documents or files
-• All memories are automatically synced with your MemoryVault app
-
-Need help? Visit: {settings.APP_BASE_URL}
-        """
+        await self._reply_md(update, _HELP_TEXT, reply_markup=_MENU_KEYBOARD)
+    
+    async def handle_menu_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle a menu keyboard button press"""
+        query = update.callback_query
+        handler = {
+            "add": self.cmd_add,
+            "status": self.cmd_status,
+            "help": self.cmd_help,
+        }[query.data]
         
-        await update.message.reply_text(help_text, parse_mode="Markdown")
+        # Stop the button's loading spinner, then reply as if the command was typed
+        await query.answer()
+        await handler(update, context)
     
     # Message Handlers
     
@@ -406,11 +680,7 @@ Need help? Visit: {settings.APP_BASE_URL}
         )
         
         if not status["connected"]:
-            await update.message.reply_text(
-                "❌ Please connect your account first using `/connect <code>`\n\n"
-                "Get your code from: {settings.APP_BASE_URL}/integrations",
-                parse_mode="Markdown"
-            )
+            await self._reply_md(update, _NOT_CONNECTED_TEXT)
             return
         
         try:
@@ -418,25 +688,24 @@ Need help? Visit: {settings.APP_BASE_URL}
             text = update.message.text
             result = await memory_service.create_memory_from_telegram(
                 user_id=status["user_id"],
-                title=text[:100],  # Use first 100 chars as title
+                title=_title_from_text(text),
                 content=text,
                 source="telegram",
                 db=db
             )
             
             if result["success"]:
-                await update.message.reply_text(
-                    "✅ Memory saved!\n\n"
-                    "🔗 View in app: {settings.APP_BASE_URL}/memories"
-                )
+                await self._reply(update, _MEMORY_SAVED_TEXT)
             else:
-                await update.message.reply_text(
+                await self._reply(
+                    update,
                     "❌ Failed to save memory. Please try again."
                 )
                 
         except Exception as e:
             logger.error(f"Error handling text message: {e}")
-            await update.message.reply_text(
+            await self._reply(
+                update,
                 "❌ An error occurred while saving your memory."
             )
     
@@ -451,29 +720,54 @@ Need help? Visit: {settings.APP_BASE_URL}
         )
         
         if not status["connected"]:
-            await update.message.reply_text(
-                "❌ Please connect your account first using `/connect <code>`",
-                parse_mode="Markdown"
+            await self._reply_md(
+                update,
+                "❌ Please connect your account first using `/connect <code>`"
             )
             return
         
         try:
-            # Send analyzing message
-            analyzing_msg = await update.message.reply_text(
-                "🔍 Analyzing image with AI...",
-                parse_mode="Markdown"
+            photo = update.message.photo[-1]  # Largest size
+            
+            # Send analyzing message while fetching file info from Telegram;
+            # the two round trips are independent
+            analyzing_msg, file = await asyncio.gather(
+                self._reply_md(
+                    update,
+                    "🔍 Analyzing image with AI..."
+                ),
+                photo.get_file()
             )
             
-            # Get photo
-            photo = update.message.photo[-1]  # Largest size
+            # Analysis and upload take seconds; free the update worker and
+            # keep this chat's photos in order
+            self._run_in_chat(
+                update.effective_chat.id,
+                lambda: self._process_photo(update, photo, file, analyzing_msg, status, db)
+            )
+        except Exception as e:
+            logger.error(f"Error handling photo: {e}")
+            await self._reply(
+                update,
+                "❌ An error occurred while saving your photo."
+            )
+    
+    async def _process_photo(
+        self,
+        update: Update,
+        photo: PhotoSize,
+        file: File,
+        analyzing_msg: Message,
+        status: Dict[str, Any],
+        db: PoolOrConnection
+    ):
+        """Analyze, upload and save a photo, then report back to the chat"""
+        try:
             caption = update.message.caption
-            
-            # Get file info from Telegram
-            file = await photo.get_file()
-            file_url = file.file_path
+            file_url = storage_service.get_telegram_file_url(file.file_path)
             file_name = f"photo_{photo.file_id}.jpg"
             
-            # Analyze image with AI
+            # Analyze image with AI; the vision API fetches it from Telegram directly
             analysis = await analyze_image_from_url(file_url, file_name)
             
             # Use AI-generated title and content, or fall back to caption
@@ -490,7 +784,8 @@ Need help? Visit: {settings.APP_BASE_URL}
                 file_type="image",
                 content_type="image/jpeg",
                 source="telegram",
-                db=db
+                db=db,
+                file_unique_id=photo.file_unique_id
             )
             
             # Delete analyzing message
@@ -510,13 +805,14 @@ Need help? Visit: {settings.APP_BASE_URL}
                 
                 response += f"\n🔗 View: {settings.APP_BASE_URL}/memories"
                 
-                await update.message.reply_text(response, parse_mode="Markdown")
+                await self._reply_md(update, response)
             else:
-                await update.message.reply_text("❌ Failed to save photo.")
+                await self._reply(update, "❌ Failed to save photo.")
                 
         except Exception as e:
             logger.error(f"Error handling photo: {e}")
-            await update.message.reply_text(
+            await self._reply(
+                update,
                 "❌ An error occurred while saving your photo."
             )
     
@@ -531,9 +827,9 @@ Need help? Visit: {settings.APP_BASE_URL}
         )
         
         if not status["connected"]:
-            await update.message.reply_text(
-                "❌ Please connect your account first using `/connect <code>`",
-                parse_mode="Markdown"
+            await self._reply_md(
+                update,
+                "❌ Please connect your account first using `/connect <code>`"
             )
             return
         
@@ -542,6 +838,13 @@ Need help? Visit: {settings.APP_BASE_URL}
             document = update.message.document
             caption = update.message.caption or document.file_name
             
+            if document.file_size and document.file_size > settings.MAX_FILE_SIZE_BYTES:
+                await self._reply(
+                    update,
+                    f"❌ File is too large (max {settings.MAX_FILE_SIZE_BYTES // (1024 * 1024)} MB)."
+                )
+                return
+            
             # Get file info from Telegram
             file = await document.get_file()
             file_path = file.file_path
@@ -559,21 +862,25 @@ Need help? Visit: {settings.APP_BASE_URL}
                 file_type="document",
                 content_type=content_type,
                 source="telegram",
-                db=db
+                db=db,
+                file_unique_id=document.file_unique_id
             )
             
             if result["success"]:
-                await update.message.reply_text(
+                await self._reply(
+                    update,
                     "✅ Document saved to your MemoryVault!"
                 )
             else:
-                await update.message.reply_text(
+                await self._reply(
+                    update,
                     "❌ Failed to save document."
                 )
                 
         except Exception as e:
             logger.error(f"Error handling document: {e}")
-            await update.message.reply_text(
+            await self._reply(
+                update,
                 "❌ An error occurred while saving your document."
             )
 
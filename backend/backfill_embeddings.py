@@ -0,0 +1,27 @@
+"""
+Generate embeddings for memories saved without one
+Run after an embedding outage or when importing old data
+"""
+import asyncio
+import sys
+
+from app.database import init_db_pool, close_db_pool
+from app.services.embedding_service import embedding_service
+from app.services.memory_service import memory_service
+
+
+async def backfill(batch_size: int):
+    # The app pool registers the halfvec codec the updates are sent with
+    pool = await init_db_pool()
+    
+    try:
+        print("Backfilling missing memory embeddings...")
+        updated = await memory_service.backfill_embeddings(pool, batch_size=batch_size)
+        print(f"✓ Backfilled embeddings for {updated} memories")
+    finally:
+        await embedding_service.aclose()
+        await close_db_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(backfill(int(sys.argv[1]) if len(sys.argv) > 1 else 256))
@@ -0,0 +1,55 @@
+"""
+Bulk-import text memories from a JSON Lines file
+Each line: {"user_id": ..., "title": ..., "content": ..., "source"?: ..., "created_at"?: ISO 8601}
+"""
+import asyncio
+import sys
+from datetime import datetime
+
+import orjson  # type: ignore
+
+from app.database import init_db_pool, close_db_pool
+from app.services.embedding_service import embedding_service
+from app.services.memory_service import memory_service
+
+# Rows per embedding request and COPY
+BATCH_SIZE = 256
+
+
+def read_rows(path: str):
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = orjson.loads(line)
+            if row.get("created_at"):
+                row["created_at"] = datetime.fromisoformat(row["created_at"])
+            yield row
+
+
+async def import_memories(path: str):
+    # The app pool registers the halfvec codec the embeddings are copied with
+    pool = await init_db_pool()
+    
+    try:
+        imported = 0
+        batch = []
+        for row in read_rows(path):
+            batch.append(row)
+            if len(batch) == BATCH_SIZE:
+                imported += len(await memory_service.bulk_create_memories(batch, pool))
+                batch = []
+        if batch:
+            imported += len(await memory_service.bulk_create_memories(batch, pool))
+        
+        print(f"✓ Imported {imported} memories from {path}")
+    finally:
+        await embedding_service.aclose()
+        await close_db_pool()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python import_memories.py memories.jsonl")
+        sys.exit(1)
+    asyncio.run(import_memories(sys.argv[1]))
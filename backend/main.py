@@ -5,14 +5,29 @@ FastAPI server for Telegram bot integration
 
 import asyncio
 from contextlib import asynccontextmanager
+from typing import Any
 
 from fastapi import FastAPI  # type: ignore
 from fastapi.middleware.cors import CORSMiddleware  # type: ignore
+from fastapi.responses import JSONResponse  # type: ignore
 from loguru import logger  # type: ignore
+import orjson  # type: ignore
 
 from app.config import settings
 from app.api import telegram_router, health_router
+from app.database import init_db_pool, close_db_pool
+from app.cache import close_redis
 from app.services.telegram_bot import telegram_service
+from app.services.embedding_service import embedding_service
+from app.services.memory_service import memory_service
+from app.services.storage_service import storage_service
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response encoded with orjson (FastAPI's own ORJSONResponse is deprecated)"""
+    
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
 
 
 @asynccontextmanager
@@ -22,6 +37,9 @@ async def lifespan(app: FastAPI):
     logger.info("Starting MemoryVault Telegram Bot Backend...")
     logger.info(f"Environment: {settings.ENVIRONMENT}")
     
+    # Open database connections before traffic arrives
+    app.state.db_pool = await init_db_pool()
+    
     # Initialize Telegram bot
     try:
         await telegram_service.initialize()
@@ -36,6 +54,11 @@ async def lifespan(app: FastAPI):
     logger.info("Shutting down MemoryVault Telegram Bot Backend...")
     await telegram_service.shutdown()
     logger.info("✓ Telegram bot shut down successfully")
+    await memory_service.aclose()
+    await embedding_service.aclose()
+    await storage_service.aclose()
+    await close_redis()
+    await close_db_pool()
 
 
 # Create FastAPI app
@@ -44,6 +67,7 @@ app = FastAPI(
     description="Backend service for MemoryVault Telegram bot integration",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # CORS middleware
@@ -71,12 +95,30 @@ async def root():
 
 
 if __name__ == "__main__":
+    import os
+    import sys
     import uvicorn  # type: ignore
     
+    reload = settings.ENVIRONMENT == "development"
+    workers = settings.SERVER_WORKERS or max(1, (os.cpu_count() or 2) // 2)
+    
+    # Without Redis, rate limits and connection statuses live in each process,
+    # so extra workers would multiply the rate limit and serve stale statuses
+    if workers > 1 and not settings.REDIS_URL:
+        logger.warning(
+            f"SERVER_WORKERS={workers} requires REDIS_URL; starting a single worker"
+        )
+        workers = 1
+    
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=8000,
-        reload=settings.ENVIRONMENT == "development",
+        reload=reload,
+        # Reload mode is single-process; otherwise each worker runs its own lifespan
+        workers=1 if reload else workers,
+        # uvloop ships with uvicorn[standard] everywhere except Windows
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
         log_level=settings.LOG_LEVEL.lower(),
     )
@@ -2,22 +2,71 @@
 Quick script to set Telegram webhook
 Run this after starting the backend server
 """
-import requests  # type: ignore
+import httpx  # type: ignore
 import os
 from dotenv import load_dotenv  # type: ignore
+from tenacity import (  # type: ignore
+    retry,
+    retry_if_exception,
+    stop_after_attempt,
+    wait_exponential_jitter,
+)
 
 load_dotenv()
 
 BACKEND_URL = os.getenv('NEXT_PUBLIC_TELEGRAM_BACKEND_URL', 'http://localhost:8000')
 
+_backoff = wait_exponential_jitter(initial=1, max=10)
+
+
+# Gateway/availability errors while the backend or tunnel comes up; a 500 is
+# the backend's own deterministic failure (e.g. missing TELEGRAM_WEBHOOK_URL)
+_RETRYABLE_STATUSES = {429, 502, 503, 504}
+
+
+def _is_retryable(error: BaseException) -> bool:
+    """Retry connection problems, 429s and gateway errors; fail fast on anything else"""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in _RETRYABLE_STATUSES
+    return isinstance(error, httpx.TransportError)
+
+
+def _wait(retry_state) -> float:
+    """Honour Retry-After when the server sends one, otherwise back off with jitter"""
+    error = retry_state.outcome.exception()
+    if isinstance(error, httpx.HTTPStatusError):
+        retry_after = error.response.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            return float(retry_after)
+    return _backoff(retry_state)
+
+
+@retry(
+    stop=stop_after_attempt(5),
+    wait=_wait,
+    retry=retry_if_exception(_is_retryable),
+    reraise=True,
+)
+def set_webhook() -> httpx.Response:
+    """Ask the backend to register its webhook with Telegram"""
+    response = httpx.post(
+        f"{BACKEND_URL}/api/telegram/set-webhook",
+        timeout=httpx.Timeout(10.0, connect=5.0),
+    )
+    response.raise_for_status()
+    return response
+
+
 print(f"Setting webhook for backend: {BACKEND_URL}")
 
 try:
-    response = requests.post(f"{BACKEND_URL}/api/telegram/set-webhook")
+    response = set_webhook()
     print(f"Status: {response.status_code}")
     print(f"Response: {response.json()}")
 except Exception as e:
     print(f"Error: {e}")
+    if isinstance(e, httpx.HTTPStatusError):
+        print(f"Response: {e.response.text}")
     print("\nMake sure:")
     print("1. Backend server is running (python main.py)")
     print("2. Ngrok is running and URL is correct in .env")
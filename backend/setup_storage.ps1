@@ -3,7 +3,7 @@ Write-Host "Setting up file storage for Telegram bot..." -ForegroundColor Green
 
 # Install dependencies
 Write-Host "`nInstalling Python dependencies..." -ForegroundColor Yellow
-pip install supabase storage3
+pip install -r requirements.txt
 
 # Create storage bucket
 Write-Host "`nCreating Supabase storage bucket..." -ForegroundColor Yellow
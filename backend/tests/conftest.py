@@ -0,0 +1,17 @@
+"""
+Shared test setup
+Services read settings at import, so required values are filled in first
+"""
+
+import os
+
+for _name in (
+    "TELEGRAM_BOT_TOKEN",
+    "DATABASE_URL",
+    "SUPABASE_URL",
+    "SUPABASE_ANON_KEY",
+    "SUPABASE_SERVICE_ROLE_KEY",
+    "GITHUB_TOKEN",
+    "API_SECRET_KEY",
+):
+    os.environ.setdefault(_name, "test")
@@ -0,0 +1,114 @@
+"""
+AuthService tests against a stand-in for an asyncpg connection
+"""
+
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from app.services import auth_service as auth_module
+from app.services.auth_service import AuthService
+
+
+class FakeConnection:
+    """Answers every fetchrow with a canned row"""
+    
+    def __init__(self, row):
+        self.row = row
+    
+    async def fetchrow(self, query, *args):
+        return self.row
+
+
+def _verify(row):
+    return asyncio.run(AuthService().verify_and_connect(
+        "ABC123", "42", "someone", "Some", "One", FakeConnection(row)
+    ))
+
+
+@pytest.mark.parametrize("row, error", [
+    (None, "Invalid code"),
+    ({"connected": False, "used": True, "expired": True}, "Code already used"),
+    ({"connected": False, "used": False, "expired": True}, "Code expired"),
+    (
+        {"connected": False, "used": False, "expired": False},
+        "Telegram account already connected to another MemoryVault account",
+    ),
+])
+def test_verify_reports_the_check_the_database_failed(row, error):
+    assert _verify(row) == {"success": False, "error": error}
+
+
+class FakeRedis:
+    """In-memory GET/SET NX/pipeline, ignoring expiry"""
+    
+    def __init__(self):
+        self.data = {}
+    
+    async def get(self, key):
+        return self.data.get(key)
+    
+    async def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+    
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc):
+        return False
+    
+    def set(self, *args, **kwargs):
+        self.commands.append((args, kwargs))
+    
+    async def execute(self):
+        return [await self.redis.set(*args, **kwargs) for args, kwargs in self.commands]
+
+
+class SlowStatusConnection:
+    """Serves the connection row once released, then reports the user disconnected"""
+    
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.queries = 0
+    
+    async def fetchrow(self, query, *args):
+        self.queries += 1
+        if self.queries == 1:
+            await self.release.wait()
+            return {"user_id": "user-1", "connected_at": datetime.now(timezone.utc), "is_active": True}
+        return None
+
+
+@pytest.mark.parametrize("with_redis", [True, False])
+def test_lookup_overlapping_a_disconnect_does_not_cache_the_old_status(monkeypatch, with_redis):
+    redis = FakeRedis() if with_redis else None
+    monkeypatch.setattr(auth_module, "get_redis", lambda: redis)
+    
+    async def run():
+        service = AuthService()
+        conn = SlowStatusConnection()
+        # Lookup reads Postgres before the disconnect and finishes after it
+        lookup = asyncio.create_task(service.get_connection_status_by_telegram("42", conn))
+        await asyncio.sleep(0)
+        await service._invalidate_status("42")
+        conn.release.set()
+        stale = await lookup
+        return stale, await service.get_connection_status_by_telegram("42", conn)
+    
+    stale, status = asyncio.run(run())
+    
+    assert stale["connected"] is True
+    assert status == {"connected": False}
@@ -0,0 +1,106 @@
+"""
+EmbeddingService coalescing tests against a mocked embeddings API
+"""
+
+import asyncio
+
+import httpx
+import orjson
+
+from app.services import embedding_service as embedding_module
+from app.services.embedding_service import EmbeddingService
+
+
+def _service(embed):
+    """Service whose API answers with embed(inputs); returns it and the list of requests"""
+    service = EmbeddingService()
+    requests = []
+    
+    def handler(request: httpx.Request) -> httpx.Response:
+        inputs = orjson.loads(request.content)["input"]
+        requests.append(inputs)
+        data = [{"index": i, "embedding": vector} for i, vector in enumerate(embed(inputs))]
+        return httpx.Response(200, content=orjson.dumps({"data": data}))
+    
+    service._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return service, requests
+
+
+def test_short_batch_reply_falls_back_to_individual_requests():
+    async def run():
+        # The batched reply drops the last vector; single-text replies are complete
+        service, requests = _service(
+            lambda inputs: [[0.0, 1.0]] * (len(inputs) - 1 if len(inputs) > 1 else 1)
+        )
+        try:
+            results = await asyncio.wait_for(
+                asyncio.gather(*(service.generate_embedding(f"text {i}") for i in range(3))),
+                timeout=1,
+            )
+        finally:
+            await service.aclose()
+        return results, requests
+    
+    results, requests = asyncio.run(run())
+    
+    assert results == [[0.0, 1.0]] * 3
+    assert requests[0] == ["text 0", "text 1", "text 2"]
+    assert sorted(requests[1:]) == [["text 0"], ["text 1"], ["text 2"]]
+
+
+def test_aclose_releases_callers_still_waiting():
+    async def run():
+        service, requests = _service(lambda inputs: [[1.0, 0.0] for _ in inputs])
+        waiters = [asyncio.create_task(service.generate_embedding(f"text {i}")) for i in range(3)]
+        # Let the texts reach the queue and the coalescer's window, then shut down
+        await asyncio.sleep(0)
+        await service.aclose()
+        return await asyncio.wait_for(asyncio.gather(*waiters), timeout=1), requests
+    
+    results, requests = asyncio.run(run())
+    
+    assert results == [None, None, None]
+    assert requests == []
+
+
+def test_batch_leaves_blank_texts_out_of_the_request():
+    async def run():
+        service, requests = _service(lambda inputs: [[1.0, 0.0] for _ in inputs])
+        try:
+            return await service.generate_embeddings_batch(["note", "", "   "]), requests
+        finally:
+            await service.aclose()
+    
+    results, requests = asyncio.run(run())
+    
+    assert results == [[1.0, 0.0], None, None]
+    assert requests == [["note"]]
+
+
+def test_per_text_fallback_is_bounded():
+    in_flight = 0
+    peak = 0
+    
+    async def run():
+        service = EmbeddingService()
+        
+        async def request_embeddings(texts, timeout):
+            nonlocal in_flight, peak
+            if len(texts) > 1:
+                return None
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return [[1.0, 0.0]]
+        
+        service._request_embeddings = request_embeddings
+        try:
+            return await service.generate_embeddings_batch([f"text {i}" for i in range(40)])
+        finally:
+            await service.aclose()
+    
+    results = asyncio.run(run())
+    
+    assert results == [[1.0, 0.0]] * 40
+    assert peak == embedding_module._MAX_FALLBACK_REQUESTS
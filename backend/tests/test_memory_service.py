@@ -0,0 +1,298 @@
+"""
+MemoryService tests against an in-memory stand-in for an asyncpg connection
+"""
+
+import asyncio
+import uuid
+
+import pytest
+
+from app import database
+from app.services.embedding_service import embedding_service
+from app.services.memory_service import MemoryService
+
+
+class FakeConnection:
+    """Just enough of asyncpg.Connection to run the backfill queries"""
+    
+    def __init__(self, memories):
+        self.memories = {memory["id"]: memory for memory in memories}
+        self.fetches = 0
+    
+    async def fetch(self, query, last_id, limit):
+        self.fetches += 1
+        pending = sorted(
+            (
+                memory for memory in self.memories.values()
+                if memory["embedding"] is None and (last_id is None or memory["id"] > last_id)
+            ),
+            key=lambda memory: memory["id"],
+        )
+        return pending[:limit]
+    
+    async def executemany(self, query, records):
+        for embedding, memory_id in records:
+            self.memories[memory_id]["embedding"] = embedding
+
+
+def _memory(title, embedding=None):
+    return {"id": uuid.uuid4(), "title": title, "content": "body", "embedding": embedding}
+
+
+@pytest.fixture
+def fake_embeddings(monkeypatch):
+    """Embed every text except those mentioning "fail" """
+    requested = []
+    
+    async def generate_embeddings_batch(texts):
+        requested.append(list(texts))
+        return [None if "fail" in text else [1.0, 0.0] for text in texts]
+    
+    monkeypatch.setattr(embedding_service, "generate_embeddings_batch", generate_embeddings_batch)
+    return requested
+
+
+def test_backfill_embeds_only_rows_without_embedding(fake_embeddings):
+    existing = [0.0, 1.0]
+    conn = FakeConnection(
+        [_memory(f"note {i}") for i in range(5)] + [_memory("done", embedding=existing)]
+    )
+    
+    updated = asyncio.run(MemoryService().backfill_embeddings(conn, batch_size=2))
+    
+    assert updated == 5
+    assert all(memory["embedding"] is not None for memory in conn.memories.values())
+    assert [m for m in conn.memories.values() if m["title"] == "done"][0]["embedding"] is existing
+    assert [len(batch) for batch in fake_embeddings] == [2, 2, 1]
+
+
+def test_backfill_skips_rows_whose_embedding_fails(fake_embeddings):
+    conn = FakeConnection([_memory("fail me"), _memory("ok 1"), _memory("ok 2")])
+    
+    updated = asyncio.run(MemoryService().backfill_embeddings(conn, batch_size=2))
+    
+    assert updated == 2
+    failed = [m for m in conn.memories.values() if m["title"] == "fail me"][0]
+    assert failed["embedding"] is None
+    # Keyset pagination moves past the failed row instead of re-reading it
+    assert sum(len(batch) for batch in fake_embeddings) == 3
+
+
+class FakeSearchConnection:
+    """Returns canned rows for the batched search query"""
+    
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+    
+    async def fetch(self, query, *args):
+        self.calls.append(args)
+        return self.rows
+
+
+def test_search_batch_groups_rows_by_query_order():
+    first, second = uuid.uuid4(), uuid.uuid4()
+    conn = FakeSearchConnection([
+        {"ord": 1, "id": first, "title": "a", "content": "", "created_at": None, "similarity": 0.9},
+        {"ord": 3, "id": second, "title": "b", "content": "", "created_at": None, "similarity": 0.8},
+    ])
+    queries = [("user-1", [1.0, 0.0]), ("user-2", [0.0, 1.0]), ("user-3", [1.0, 0.0])]
+    
+    results = asyncio.run(MemoryService().search_memories_batch(queries, 5, conn))
+    
+    assert [[memory["id"] for memory in found] for found in results] == [[first], [], [second]]
+    assert "ord" not in results[0][0]
+    # One round trip carrying every query
+    assert conn.calls == [(["user-1", "user-2", "user-3"], [[1.0, 0.0], [0.0, 1.0], [1.0, 0.0]], 5)]
+
+
+def test_search_batch_without_queries_skips_the_database():
+    conn = FakeSearchConnection([])
+    
+    assert asyncio.run(MemoryService().search_memories_batch([], 5, conn)) == []
+    assert conn.calls == []
+
+
+class FakeCopyConnection:
+    """Records COPY calls instead of writing them"""
+    
+    def __init__(self):
+        self.copies = []
+    
+    async def copy_records_to_table(self, table, records, columns):
+        self.copies.append((table, list(records), columns))
+
+
+def test_bulk_create_copies_rows_with_embeddings_in_order(fake_embeddings):
+    conn = FakeCopyConnection()
+    rows = [
+        {"user_id": "user-1", "title": "first", "content": "x"},
+        {"user_id": "user-1", "title": "fail", "content": "y", "source": "notion"},
+    ]
+    
+    memory_ids = asyncio.run(MemoryService().bulk_create_memories(rows, conn))
+    
+    [(table, records, columns)] = conn.copies
+    assert table == "memories"
+    assert fake_embeddings == [["first x", "fail y"]]
+    as_dicts = [dict(zip(columns, record)) for record in records]
+    assert [row["id"] for row in as_dicts] == memory_ids
+    assert [row["title"] for row in as_dicts] == ["first", "fail"]
+    assert [row["embedding"] for row in as_dicts] == [[1.0, 0.0], None]
+    assert [row["source"] for row in as_dicts] == ["import", "notion"]
+    assert all(row["created_at"] is not None for row in as_dicts)
+
+
+def test_bulk_create_without_rows_skips_the_database(fake_embeddings):
+    conn = FakeCopyConnection()
+    
+    assert asyncio.run(MemoryService().bulk_create_memories([], conn)) == []
+    assert conn.copies == [] and fake_embeddings == []
+
+
+class FailingConnection:
+    """Fails every query, after letting other tasks run"""
+    
+    async def fetchrow(self, query, *args):
+        await asyncio.sleep(0)
+        raise ConnectionError("connection lost")
+
+
+def test_create_with_file_cancels_embedding_when_dedup_lookup_fails(monkeypatch):
+    started = []
+    
+    async def generate_embedding(text):
+        started.append(asyncio.current_task())
+        await asyncio.sleep(10)
+    
+    monkeypatch.setattr(embedding_service, "generate_embedding", generate_embedding)
+    
+    async def run():
+        result = await MemoryService().create_memory_with_file(
+            "user-1", "photo", "", "photos/a.jpg", "a.jpg", "image", "image/jpeg",
+            "telegram", FailingConnection(), file_unique_id="unique"
+        )
+        # Give a cancelled task the chance to finish cancelling
+        await asyncio.sleep(0)
+        return result, [task.cancelled() for task in started]
+    
+    result, cancelled = asyncio.run(run())
+    
+    assert result == {"success": False, "error": "connection lost"}
+    assert cancelled == [True]
+
+
+class RejectingCopyConnection(FakeCopyConnection):
+    """Fails any COPY that contains a row titled "bad", like a constraint violation"""
+    
+    async def copy_records_to_table(self, table, records, columns):
+        if any(record[2] == "bad" for record in records):
+            raise ValueError("bad row")
+        await super().copy_records_to_table(table, records, columns)
+
+
+def _record(user_id, title):
+    return (uuid.uuid4(), user_id, title, "", "text", None, "telegram")
+
+
+def test_concurrent_writes_share_one_copy_in_user_order():
+    conn = FakeCopyConnection()
+    records = [_record(user_id, "note") for user_id in ("user-b", "user-a", "user-c")]
+    
+    async def run():
+        service = MemoryService()
+        try:
+            return await asyncio.gather(
+                *(service._write_memory(conn, record) for record in records)
+            )
+        finally:
+            await service.aclose()
+    
+    memory_ids = asyncio.run(run())
+    
+    assert memory_ids == [record[0] for record in records]
+    [(_, copied, _)] = conn.copies
+    # Sorted by user so overlapping batches take per-user locks in one order
+    assert [record[1] for record in copied] == ["user-a", "user-b", "user-c"]
+
+
+def test_failed_batch_is_retried_row_by_row(monkeypatch):
+    async def generate_embedding(text):
+        return None
+    
+    monkeypatch.setattr(embedding_service, "generate_embedding", generate_embedding)
+    conn = RejectingCopyConnection()
+    
+    async def run():
+        service = MemoryService()
+        try:
+            return await asyncio.gather(*(
+                service.create_memory_from_telegram("user-1", title, "", "telegram", conn)
+                for title in ("good", "bad", "also good")
+            ))
+        finally:
+            await service.aclose()
+    
+    good, bad, also_good = asyncio.run(run())
+    
+    assert good["success"] and also_good["success"]
+    assert bad == {"success": False, "error": "bad row"}
+    assert [[record[2] for record in copied] for _, copied, _ in conn.copies] == [
+        ["good"], ["also good"]
+    ]
+
+
+def test_aclose_writes_rows_still_waiting_for_the_window():
+    conn = FakeCopyConnection()
+    records = [_record("user-1", f"note {i}") for i in range(3)]
+    
+    async def run():
+        service = MemoryService()
+        writes = [asyncio.create_task(service._write_memory(conn, record)) for record in records]
+        # Rows are queued and the writer is inside its window when shutdown starts
+        await asyncio.sleep(0)
+        await service.aclose()
+        return await asyncio.wait_for(asyncio.gather(*writes), timeout=1)
+    
+    memory_ids = asyncio.run(run())
+    
+    assert memory_ids == [record[0] for record in records]
+    assert sorted(record[2] for _, copied, _ in conn.copies for record in copied) == [
+        "note 0", "note 1", "note 2"
+    ]
+
+
+class TransactionalSearchConnection(FakeSearchConnection):
+    """Logs transaction boundaries and statements in order"""
+    
+    def __init__(self, rows):
+        super().__init__(rows)
+        self.log = []
+    
+    def transaction(self):
+        log = self.log
+        
+        class Transaction:
+            async def __aenter__(self):
+                log.append("BEGIN")
+            
+            async def __aexit__(self, *exc):
+                log.append("COMMIT")
+        
+        return Transaction()
+    
+    async def execute(self, query):
+        self.log.append(query)
+    
+    async def fetch(self, query, *args):
+        self.log.append("search")
+        return await super().fetch(query, *args)
+
+
+def test_hnsw_settings_are_set_locally_around_the_search(monkeypatch):
+    monkeypatch.setattr(database, "_HNSW_SET_LOCAL_SQL", "SET LOCAL hnsw.ef_search = 100")
+    conn = TransactionalSearchConnection([])
+    
+    asyncio.run(MemoryService().search_memories_batch([("user-1", [1.0, 0.0])], 5, conn))
+    
+    assert conn.log == ["BEGIN", "SET LOCAL hnsw.ef_search = 100", "search", "COMMIT"]
@@ -0,0 +1,60 @@
+"""
+OutboundBatcher tests with a stand-in Bot
+"""
+
+import asyncio
+
+from app.services import outbound_batcher
+from app.services.outbound_batcher import OutboundBatcher
+
+
+class FakeBot:
+    """Records when each message was sent"""
+    
+    def __init__(self):
+        self.sent = []
+    
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append((asyncio.get_running_loop().time(), chat_id, text))
+        return text
+
+
+def test_sends_are_paced_across_chats(monkeypatch):
+    monkeypatch.setattr(outbound_batcher, "_SEND_INTERVAL_SECONDS", 0.02)
+    
+    async def run():
+        bot = FakeBot()
+        batcher = OutboundBatcher(bot)
+        batcher.start()
+        try:
+            replies = await asyncio.gather(
+                *(batcher.send(chat_id, f"hi {chat_id}") for chat_id in range(5))
+            )
+        finally:
+            await batcher.stop()
+        return replies, bot.sent
+    
+    replies, sent = asyncio.run(run())
+    
+    assert replies == [f"hi {chat_id}" for chat_id in range(5)]
+    starts = [at for at, _, _ in sent]
+    gaps = [later - earlier for earlier, later in zip(starts, starts[1:])]
+    # Different chats go out concurrently but never faster than the interval
+    assert min(gaps) >= 0.019
+
+
+def test_stop_mid_window_still_sends_queued_messages():
+    async def run():
+        bot = FakeBot()
+        batcher = OutboundBatcher(bot)
+        batcher.start()
+        reply = asyncio.create_task(batcher.send(1, "hi"))
+        # The flush loop has taken the message and is waiting out the window
+        await asyncio.sleep(0.01)
+        await batcher.stop()
+        return await asyncio.wait_for(reply, timeout=1), bot.sent
+    
+    reply, sent = asyncio.run(run())
+    
+    assert reply == "hi"
+    assert [(chat_id, text) for _, chat_id, text in sent] == [(1, "hi")]
@@ -0,0 +1,30 @@
+"""
+Telegram bot helper tests
+"""
+
+from app.services.telegram_bot import _title_from_text
+
+
+def test_short_text_is_its_own_title():
+    assert _title_from_text("Buy milk") == "Buy milk"
+
+
+def test_long_text_is_cut_at_a_word_boundary():
+    text = "word " * 30
+    
+    title = _title_from_text(text)
+    
+    assert len(title) <= 100
+    assert title.endswith("word")
+
+
+def test_short_word_boundary_cut_falls_back_to_the_first_100_chars():
+    url = "https://example.com/" + "x" * 150
+    
+    assert _title_from_text("a " + url) == ("a " + url)[:100]
+
+
+def test_cut_drops_trailing_whitespace():
+    text = "x" * 70 + ". " + "  " + "y" * 100
+    
+    assert _title_from_text(text) == "x" * 70 + "."
@@ -0,0 +1,11 @@
+-- Add HNSW index for memory vector search
+--
+-- Semantic search orders by `embedding <=> query` (cosine distance). Without
+-- an index this is a sequential scan plus top-N sort over every user row.
+-- The HNSW index lets the planner answer the ORDER BY ... LIMIT with an
+-- index scan. The user_id filter is already backed by idx_memories_user_id.
+
+CREATE INDEX IF NOT EXISTS memories_embedding_hnsw_idx
+  ON memories
+  USING hnsw (embedding vector_cosine_ops)
+  WITH (m = 16, ef_construction = 64);
@@ -0,0 +1,15 @@
+-- Add trigram indexes for memory text search
+--
+-- The text-search fallback filters with `title ILIKE '%q%' OR content ILIKE '%q%'`,
+-- which cannot use a btree index and scans every row of the user. GIN trigram
+-- indexes let the planner answer both predicates with bitmap index scans.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS memories_title_trgm_idx
+  ON memories
+  USING GIN (title gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS memories_content_trgm_idx
+  ON memories
+  USING GIN (content gin_trgm_ops);
@@ -0,0 +1,57 @@
+-- Rank memory search by inner product instead of cosine distance
+--
+-- Embeddings are unit length (the embedding models return normalized vectors
+-- and the backend normalizes defensively), so cosine similarity equals the
+-- inner product. `<#>` (negative inner product) skips the per-comparison
+-- norm computation that `<=>` performs, both in exact scans and in every
+-- distance call during HNSW traversal.
+
+DROP INDEX IF EXISTS memories_embedding_hnsw_idx;
+
+CREATE INDEX IF NOT EXISTS memories_embedding_hnsw_idx
+  ON memories
+  USING hnsw (embedding vector_ip_ops)
+  WITH (m = 16, ef_construction = 64);
+
+CREATE OR REPLACE FUNCTION search_memories(
+  query_embedding vector(1536),
+  match_threshold float,
+  match_count int,
+  user_id_param uuid
+)
+RETURNS TABLE (
+  id uuid,
+  user_id uuid,
+  title text,
+  content text,
+  type text,
+  embedding vector(1536),
+  index_position integer,
+  created_at timestamptz,
+  updated_at timestamptz,
+  similarity float
+)
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+  RETURN QUERY
+  SELECT
+    m.id,
+    m.user_id,
+    m.title,
+    m.content,
+    m.type,
+    m.embedding,
+    m.index_position,
+    m.created_at,
+    m.updated_at,
+    (m.embedding <#> query_embedding) * -1 as similarity
+  FROM memories m
+  WHERE m.user_id = user_id_param
+    AND m.embedding IS NOT NULL
+    AND (m.embedding <#> query_embedding) * -1 > match_threshold
+  ORDER BY m.embedding <#> query_embedding
+  LIMIT match_count;
+END;
+$$;
@@ -0,0 +1,66 @@
+-- Store memory embeddings as halfvec (fp16)
+--
+-- Every distance computation is bound by reading the 1536-dim vector from the
+-- heap or an HNSW node. Half precision shrinks each embedding from 6KB to 3KB,
+-- halving table/index size and memory bandwidth per comparison, with
+-- negligible recall loss for these embedding models.
+--
+-- Requires pgvector >= 0.7. Clients may keep sending vector(1536) literals;
+-- they are cast on assignment.
+
+DROP INDEX IF EXISTS memories_embedding_hnsw_idx;
+
+ALTER TABLE memories
+  ALTER COLUMN embedding TYPE halfvec(1536)
+  USING embedding::halfvec(1536);
+
+CREATE INDEX IF NOT EXISTS memories_embedding_hnsw_idx
+  ON memories
+  USING hnsw (embedding halfvec_ip_ops)
+  WITH (m = 16, ef_construction = 64);
+
+-- Keep the frontend RPC signature; cast the query down and the result back up
+CREATE OR REPLACE FUNCTION search_memories(
+  query_embedding vector(1536),
+  match_threshold float,
+  match_count int,
+  user_id_param uuid
+)
+RETURNS TABLE (
+  id uuid,
+  user_id uuid,
+  title text,
+  content text,
+  type text,
+  embedding vector(1536),
+  index_position integer,
+  created_at timestamptz,
+  updated_at timestamptz,
+  similarity float
+)
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  query_half halfvec(1536) := query_embedding::halfvec(1536);
+BEGIN
+  RETURN QUERY
+  SELECT
+    m.id,
+    m.user_id,
+    m.title,
+    m.content,
+    m.type,
+    m.embedding::vector(1536),
+    m.index_position,
+    m.created_at,
+    m.updated_at,
+    (m.embedding <#> query_half) * -1 as similarity
+  FROM memories m
+  WHERE m.user_id = user_id_param
+    AND m.embedding IS NOT NULL
+    AND (m.embedding <#> query_half) * -1 > match_threshold
+  ORDER BY m.embedding <#> query_half
+  LIMIT match_count;
+END;
+$$;
@@ -0,0 +1,33 @@
+-- Assign memories.index_position in the database
+--
+-- Writers used to compute MAX(index_position) + 1 themselves, which costs a
+-- lookup on every insert and hands out duplicate positions when two inserts
+-- for the same user race. A BEFORE INSERT trigger now fills the column when
+-- it is omitted. A per-user transaction-scoped advisory lock serializes
+-- concurrent inserts for that user only; the MAX is an index lookup on
+-- idx_memories_index_position (user_id, index_position).
+--
+-- Rows inserted with an explicit index_position are left untouched.
+
+CREATE OR REPLACE FUNCTION assign_memory_index_position()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF NEW.index_position IS NULL THEN
+    PERFORM pg_advisory_xact_lock(hashtext('memories_index_position'), hashtext(NEW.user_id::text));
+
+    SELECT COALESCE(MAX(index_position), 0) + 1
+      INTO NEW.index_position
+      FROM memories
+      WHERE user_id = NEW.user_id;
+  END IF;
+
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS assign_memories_index_position ON memories;
+
+CREATE TRIGGER assign_memories_index_position
+  BEFORE INSERT ON memories
+  FOR EACH ROW
+  EXECUTE FUNCTION assign_memory_index_position();
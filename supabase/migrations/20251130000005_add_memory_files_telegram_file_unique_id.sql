@@ -0,0 +1,13 @@
+-- Track Telegram's file_unique_id on memory files
+--
+-- Users often send the same attachment twice (forwarded photos, re-shared
+-- documents). Telegram's file_unique_id identifies the file across re-sends,
+-- so the bot can look up an earlier upload for the same user and reuse its
+-- stored object instead of downloading and uploading the bytes again.
+
+ALTER TABLE memory_files
+  ADD COLUMN IF NOT EXISTS telegram_file_unique_id text;
+
+CREATE INDEX IF NOT EXISTS memory_files_telegram_file_unique_id_idx
+  ON memory_files (telegram_file_unique_id)
+  WHERE telegram_file_unique_id IS NOT NULL;
@@ -0,0 +1,25 @@
+-- Covering index for recent-memory listings
+--
+-- /list reads the newest memories for a user by (user_id, created_at DESC)
+-- and shows id, source and a title cut to 50 characters. title itself is
+-- unbounded text: a long enough value would push an index entry past the
+-- btree row size limit (~2.7 kB) and fail the INSERT. title_preview is a
+-- bounded copy kept by Postgres, so it can live in the index leaf and the
+-- listing is served by an index-only scan without touching the heap.
+--
+-- Adding a stored generated column rewrites the table once.
+--
+-- Supersedes idx_memories_created_at (same key columns). The covering index
+-- is dropped first in case an earlier revision of it was already built.
+
+ALTER TABLE memories
+  ADD COLUMN IF NOT EXISTS title_preview varchar(100)
+  GENERATED ALWAYS AS (left(title, 100)) STORED;
+
+DROP INDEX IF EXISTS memories_user_created_cover_idx;
+
+CREATE INDEX IF NOT EXISTS memories_user_created_cover_idx
+  ON memories (user_id, created_at DESC)
+  INCLUDE (id, title_preview, source);
+
+DROP INDEX IF EXISTS idx_memories_created_at;
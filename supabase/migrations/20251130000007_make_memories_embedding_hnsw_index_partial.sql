@@ -0,0 +1,17 @@
+-- Restrict the memory HNSW index to rows that have an embedding
+--
+-- Semantic search always filters on `embedding IS NOT NULL`. Making the index
+-- partial on the same predicate lets the planner match it directly, and the
+-- graph only contains rows the query can return, so nothing is discarded
+-- after the index scan for that predicate.
+--
+-- The per-user filter is handled by hnsw.iterative_scan (pgvector >= 0.8),
+-- set per search transaction through the HNSW_ITERATIVE_SCAN setting.
+
+DROP INDEX IF EXISTS memories_embedding_hnsw_idx;
+
+CREATE INDEX IF NOT EXISTS memories_embedding_hnsw_idx
+  ON memories
+  USING hnsw (embedding halfvec_ip_ops)
+  WITH (m = 16, ef_construction = 64)
+  WHERE embedding IS NOT NULL;